@@ -0,0 +1,353 @@
+"""
+Пакетная генерация черновиков постов на неделю через Message Batches API.
+
+Один снимок трендов (get_product_trends) -> N запросов на разные темы и углы подачи
+-> один batch. Batch обрабатывается асинхронно (дешевле интерактивного chat()),
+результаты сохраняются в SQLite и переживают рестарт: прерванный прогон
+продолжается через --resume.
+
+    python batch_drafts.py --count 7
+    python batch_drafts.py --resume msgbatch_...
+    python batch_drafts.py --list
+    python batch_drafts.py --offline --count 5     # локальный стенд вместо API
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from linkedin_agent import LinkedInAgent
+from tool_encoding import compact_tool_result
+
+logger = logging.getLogger(__name__)
+
+# Углы подачи - чтобы черновики недели не повторяли друг друга
+ANGLES = [
+    "практический гайд с шагами",
+    "история из опыта команды",
+    "контринтуитивный взгляд",
+    "фреймворк для принятия решений",
+    "разбор метрик и данных",
+    "типичные ошибки и как их избежать",
+    "вопрос к аудитории и дискуссия",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    ended_at REAL
+);
+CREATE TABLE IF NOT EXISTS drafts (
+    batch_id TEXT NOT NULL,
+    custom_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    angle TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT '',
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (batch_id, custom_id)
+);
+"""
+
+
+class DraftStore:
+    """
+    SQLite хранилище batch'ей и черновиков
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def add_batch(self, batch_id: str, plan: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches (id, status, requests, created_at) VALUES (?, ?, ?, ?)",
+                (batch_id, "in_progress", len(plan), now)
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO drafts (batch_id, custom_id, topic, angle, status, created_at) "
+                "VALUES (?, ?, ?, ?, 'pending', ?)",
+                [(batch_id, item["custom_id"], item["topic"], item["angle"], now) for item in plan]
+            )
+
+    def has_batch(self, batch_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return row is not None
+
+    def finish_batch(self, batch_id: str, status: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE batches SET status = ?, ended_at = ? WHERE id = ?",
+                               (status, time.time(), batch_id))
+
+    def save_result(self, batch_id: str, custom_id: str, status: str, text: str = "",
+                    error: str = "", input_tokens: int = 0, output_tokens: int = 0) -> bool:
+        """
+        False, если такого черновика в хранилище нет
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE drafts SET status = ?, text = ?, error = ?, input_tokens = ?, output_tokens = ? "
+                "WHERE batch_id = ? AND custom_id = ?",
+                (status, text, error, input_tokens, output_tokens, batch_id, custom_id)
+            )
+        return cursor.rowcount > 0
+
+    def drafts(self, batch_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM drafts WHERE batch_id = ? ORDER BY custom_id", (batch_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def batches(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM batches ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BatchDraftGenerator:
+    """
+    Планирует, отправляет и собирает batch черновиков.
+    Запросы без инструментов: контекст трендов уже в сообщении, один ход на черновик.
+    Общий префикс (системный промпт + тренды) помечен cache_control.
+    """
+
+    def __init__(self, agent: LinkedInAgent, store: DraftStore,
+                 poll_interval: float = 30, max_poll_interval: float = 300,
+                 context_token_ceiling: int = 1500):
+        self.agent = agent
+        self.store = store
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.context_token_ceiling = context_token_ceiling
+
+    def plan(self, trends: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+        """
+        Темы из ключевых слов и заголовков снимка, каждой - свой угол подачи
+        """
+        topics = [keyword["word"] for keyword in trends.get("trending_keywords", [])]
+        for group in trends.get("data", {}).values():
+            topics.extend(item.get("title", "") for item in group)
+        topics = [topic for topic in dict.fromkeys(topics) if topic][:max(count, 1)]
+        if not topics:
+            topics = [self.agent.industry]
+
+        return [
+            {
+                "custom_id": f"draft-{index:02d}",
+                "topic": topics[index % len(topics)],
+                "angle": ANGLES[index % len(ANGLES)]
+            }
+            for index in range(count)
+        ]
+
+    def system_prompt(self) -> List[Dict[str, Any]]:
+        """
+        Отдельный промпт для batch: интерактивный описывает инструменты и workflow
+        с публикацией, а batch-запросы уходят без tools и ждут один готовый текст
+        """
+        text = f"""Ты - автор LinkedIn постов для продакт аудитории.
+
+Индустрия: {self.agent.industry}
+Аудитория: {self.agent.target_audience or "Product Managers, Directors of Product, Product Leads"}
+
+Пишешь черновик по теме и углу подачи из запроса, опираясь на снимок трендов.
+Инструментов и доступа к сети нет: не обещай проверить данные и не предлагай следующих шагов.
+
+Стиль:
+- Экспертный, но доступный тон, практично и без воды
+- Сильный хук с конкретной проблемой PM, контекст или данные, практический инсайт, actionable takeaway, вопрос для обсуждения
+- Короткие абзацы по 2-3 строки, эмодзи минимально и только для структуры
+- Без Markdown разметки (### ** __ ``` |), списки через эмодзи
+- В конце 3-5 хэштегов, например #ProductManagement #ProductStrategy #PMTips
+
+Верни только текст поста, без вступлений и комментариев."""
+        return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+    def build_requests(self, trends: Dict[str, Any], plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        system = self.system_prompt()
+        context, _ = compact_tool_result(trends, token_ceiling=self.context_token_ceiling)
+        trends_block = {
+            "type": "text",
+            "text": f"АКТУАЛЬНЫЕ ТРЕНДЫ (снимок get_product_trends):\n{context}",
+            "cache_control": {"type": "ephemeral"}
+        }
+        return [
+            {
+                "custom_id": item["custom_id"],
+                "params": {
+                    "model": self.agent.model,
+                    "max_tokens": self.agent.max_tokens,
+                    "system": system,
+                    "messages": [{"role": "user", "content": [trends_block, {
+                        "type": "text",
+                        "text": (
+                            f"Напиши черновик LinkedIn поста на тему «{item['topic']}». "
+                            f"Угол подачи: {item['angle']}. Опирайся на тренды выше."
+                        )
+                    }]}]
+                }
+            }
+            for item in plan
+        ]
+
+    def submit(self, count: int) -> str:
+        trends = self.agent.get_product_trends()
+        if not trends.get("success"):
+            raise RuntimeError(f"Не удалось получить тренды: {trends.get('error')}")
+        plan = self.plan(trends, count)
+        batch = self.agent.client.messages.batches.create(requests=self.build_requests(trends, plan))
+        self.store.add_batch(batch.id, plan)
+        logger.info(f"Batch {batch.id}: отправлено {len(plan)} запросов")
+        return batch.id
+
+    def wait(self, batch_id: str, timeout: float = 24 * 3600):
+        """
+        Опрос статуса с растущим интервалом до processing_status == "ended"
+        """
+        deadline = time.monotonic() + timeout
+        interval = self.poll_interval
+        while True:
+            batch = self.agent.client.messages.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            logger.info(f"Batch {batch_id}: {batch.processing_status}, "
+                        f"готово {counts.succeeded + counts.errored}/"
+                        f"{counts.processing + counts.succeeded + counts.errored + counts.canceled + counts.expired}")
+            if batch.processing_status == "ended":
+                return batch
+            if time.monotonic() + interval > deadline:
+                raise TimeoutError(f"Batch {batch_id} не завершился за {timeout}с")
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    def collect(self, batch_id: str) -> List[Dict[str, Any]]:
+        """
+        Забирает результаты и сохраняет черновики
+        """
+        for entry in self.agent.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == "succeeded":
+                message = result.message
+                saved = self.store.save_result(
+                    batch_id, entry.custom_id, "succeeded",
+                    text=self.agent._extract_text(message.content),
+                    input_tokens=message.usage.input_tokens or 0,
+                    output_tokens=message.usage.output_tokens or 0
+                )
+            else:
+                # errored: result.error.error - объект ошибки API; canceled/expired без деталей
+                detail = getattr(getattr(result, "error", None), "error", None)
+                saved = self.store.save_result(batch_id, entry.custom_id, result.type,
+                                               error=getattr(detail, "message", None) or str(detail or ""))
+            if not saved:
+                logger.warning(f"Batch {batch_id}: результат {entry.custom_id} не соответствует ни одному черновику")
+        self.store.finish_batch(batch_id, "ended")
+        return self.store.drafts(batch_id)
+
+    def run(self, count: int, timeout: float = 24 * 3600) -> List[Dict[str, Any]]:
+        batch_id = self.submit(count)
+        self.wait(batch_id, timeout)
+        return self.collect(batch_id)
+
+
+def print_drafts(drafts: List[Dict[str, Any]]) -> None:
+    for draft in drafts:
+        print("=" * 60)
+        print(f"{draft['custom_id']} [{draft['status']}] {draft['topic']} / {draft['angle']}")
+        print(draft["text"] or draft["error"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пакетная генерация черновиков постов")
+    parser.add_argument("--count", type=int, default=7, help="сколько черновиков")
+    parser.add_argument("--resume", help="дождаться и собрать уже отправленный batch")
+    parser.add_argument("--list", action="store_true", help="последние batch'и")
+    parser.add_argument("--store", default=os.path.join(os.getenv("DATA_DIR", "data"), "drafts.sqlite3"))
+    parser.add_argument("--poll-interval", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=24 * 3600)
+    parser.add_argument("--industry", default="product management")
+    parser.add_argument("--audience", default="Product Managers, Directors of Product, Product Leads")
+    parser.add_argument("--base-url", default=os.getenv("ANTHROPIC_BASE_URL"),
+                        help="адрес Messages API (например, локальный стенд)")
+    parser.add_argument("--offline", action="store_true",
+                        help="поднять локальный стенд benchmarks.stubs вместо внешних сервисов")
+    parser.add_argument("--json", action="store_true", help="вывести черновики в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    store = DraftStore(args.store)
+    if args.list:
+        for batch in store.batches():
+            print(f"{batch['id']}  {batch['status']:<12} {batch['requests']} запросов  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(batch['created_at']))}")
+        return 0
+
+    if args.resume and not store.has_batch(args.resume):
+        print(f"Batch {args.resume} не найден в {args.store}", file=sys.stderr)
+        return 1
+
+    stub = None
+    if args.offline:
+        from benchmarks.stubs import StubConfig, StubServer
+        stub = StubServer(StubConfig(latency_scale=0.1)).start()
+        args.base_url = stub.anthropic_base_url
+        args.poll_interval = min(args.poll_interval, 0.5)
+
+    try:
+        agent = LinkedInAgent(
+            os.getenv("ANTHROPIC_API_KEY", "offline-key" if args.offline else None),
+            os.getenv("LINKEDIN_ACCESS_TOKEN", "mock_token_test_mode"),
+            industry=args.industry,
+            target_audience=args.audience,
+            anthropic_base_url=args.base_url
+        )
+        if stub is not None:
+            stub.configure_agent(agent)
+        generator = BatchDraftGenerator(agent, store, poll_interval=args.poll_interval)
+
+        if args.resume:
+            generator.wait(args.resume, args.timeout)
+            drafts = generator.collect(args.resume)
+        else:
+            drafts = generator.run(args.count, args.timeout)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if args.json:
+        print(json.dumps(drafts, ensure_ascii=False, indent=2))
+    else:
+        print_drafts(drafts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Детерминированные данные для стендов: RSS/Atom фиды, истории HN, посты Reddit
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+from xml.sax.saxutils import escape
+
+# Даты материалов отсчитываются от текущего часа, чтобы окна 24h/7d
+# хранилища и скорость трендов видели данные стенда как свежие
+ANCHOR = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+TOPICS = [
+    "product discovery", "user research", "product-market fit", "retention metrics",
+    "roadmap prioritization", "AI in product development", "product-led growth",
+    "stakeholder management", "jobs to be done", "north star metric", "pricing experiments",
+    "onboarding activation", "churn prediction", "feature flags", "B2B SaaS",
+    "design systems", "OKR planning", "customer interviews", "A/B testing", "platform strategy"
+]
+WORDS = (
+    "team teams product manager managers roadmap strategy metrics growth users customer data "
+    "experiment launch feature backlog sprint discovery insight framework leadership hiring "
+    "engineering design analytics funnel cohort revenue pricing market signal feedback vision"
+).split()
+TITLE_TEMPLATES = [
+    "How we rethought {topic} at a {size} startup",
+    "{Topic}: lessons from {n} launches",
+    "Why {topic} fails without clear ownership",
+    "A practical guide to {topic} for PMs",
+    "{Topic} is changing how teams ship in 2025",
+    "What {n} product leaders say about {topic}",
+]
+
+
+def _title(rng: random.Random) -> str:
+    topic = rng.choice(TOPICS)
+    return rng.choice(TITLE_TEMPLATES).format(
+        topic=topic, Topic=topic[:1].upper() + topic[1:],
+        size=rng.choice(["seed", "Series B", "10-person", "public"]), n=rng.randint(3, 50)
+    )
+
+
+def _summary(rng: random.Random, words: int = 40) -> str:
+    topic = rng.choice(TOPICS)
+    body = " ".join(rng.choice(WORDS) for _ in range(words))
+    return f"<p>{topic.capitalize()}: {body}. <a href=\"https://example.com\">Read more</a></p>"
+
+
+def rss_feed(name: str, items: int, seed: int = 0) -> bytes:
+    rng = random.Random(f"{name}:{seed}")
+    now = ANCHOR
+    entries = []
+    for index in range(items):
+        published = (now - timedelta(hours=index * 3)).strftime("%a, %d %b %Y %H:%M:%S +0000")
+        entries.append(
+            "<item>"
+            f"<title>{escape(_title(rng))}</title>"
+            f"<link>https://{name}.example.com/posts/{index}?utm_source=rss</link>"
+            f"<description>{escape(_summary(rng))}</description>"
+            f"<pubDate>{published}</pubDate>"
+            f"<guid>{name}-{index}</guid>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        f"<title>{escape(name)} blog</title><link>https://{name}.example.com</link>"
+        f"<description>Fixture feed</description>{''.join(entries)}</channel></rss>"
+    ).encode("utf-8")
+
+
+def atom_feed(name: str, items: int, seed: int = 0) -> bytes:
+    rng = random.Random(f"atom:{name}:{seed}")
+    now = ANCHOR
+    entries = []
+    for index in range(items):
+        updated = (now - timedelta(hours=index * 5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        entries.append(
+            "<entry>"
+            f"<title>{escape(_title(rng))}</title>"
+            f'<link href="https://{name}.example.com/entry/{index}"/>'
+            f"<id>urn:{name}:{index}</id><updated>{updated}</updated>"
+            f"<summary type=\"html\">{escape(_summary(rng))}</summary>"
+            "</entry>"
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>{escape(name)} atom</title><id>urn:{name}</id>"
+        f"<updated>{now.strftime('%Y-%m-%dT%H:%M:%SZ')}</updated>{''.join(entries)}</feed>"
+    ).encode("utf-8")
+
+
+def hn_stories(count: int, seed: int = 0) -> Dict[int, Dict[str, Any]]:
+    rng = random.Random(f"hn:{seed}")
+    stories = {}
+    for index in range(count):
+        story_id = 40000000 + index
+        stories[story_id] = {
+            "id": story_id,
+            "type": "story",
+            "title": _title(rng),
+            # Часть историй ссылается на те же статьи, что и RSS - для дедупликации
+            "url": f"https://feed{index % 3}.example.com/posts/{index % 5}" if index % 4 == 0
+            else f"https://news.example.org/{story_id}",
+            "score": rng.randint(10, 900),
+            "descendants": rng.randint(0, 400),
+            "by": "fixture",
+            "time": int(ANCHOR.timestamp()) - index * 2 * 3600,
+        }
+    return stories
+
+
+def reddit_listing(subreddit: str, count: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(f"reddit:{subreddit}:{seed}")
+    children: List[Dict[str, Any]] = []
+    for index in range(count):
+        post_id = f"{subreddit[:3].lower()}{index:04d}"
+        children.append({"kind": "t3", "data": {
+            "id": post_id,
+            "title": _title(rng),
+            "selftext": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "score": rng.randint(5, 2000),
+            "num_comments": rng.randint(0, 300),
+            "permalink": f"/r/{subreddit}/comments/{post_id}/fixture/",
+            "url_overridden_by_dest": f"https://news.example.org/{40000000 + index * 4}" if index % 3 == 0 else None,
+            "created_utc": int(ANCHOR.timestamp()) - index * 3600,
+            "subreddit": subreddit,
+        }})
+    return {"kind": "Listing", "data": {"children": children, "after": None}}
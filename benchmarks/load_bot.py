@@ -0,0 +1,314 @@
+"""
+Нагрузочный прогон Telegram бота: N пользователей шлют /trends, /create, /analyze
+и обычный текст через настоящие обработчики из telegram_bot.build_application.
+Bot API замокан (FakeBotRequest), агент ходит в локальный стенд benchmarks.stubs.
+
+    python -m benchmarks.load_bot --users 50 --ramp 10 --actions 3
+    python -m benchmarks.load_bot --users 200 --concurrent-updates 256 --output /tmp/load.json
+    python -m benchmarks.load_bot --users 20 --serial      # + прогон с последовательной очередью PTB
+
+Отчет: латентность по командам (от постановки апдейта в очередь до конца обработки),
+лаг event loop, вызовы Bot API и пик памяти.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest, RequestData
+
+from benchmarks.run import percentile
+from benchmarks.stubs import StubConfig, StubServer
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False,
+            "supports_inline_queries": False}
+
+FREE_TEXT = [
+    "Что обсуждают PM на этой неделе?",
+    "Найди горячую тему и создай пост",
+    "Дай топ-3 тренда недели для PM",
+    "Проверь актуальность темы retention metrics",
+]
+ANALYZE_TOPICS = ["AI в product discovery", "retention metrics", "product-led growth", "OKR planning"]
+
+
+class FakeBotRequest(BaseRequest):
+    """
+    Мок Bot API: отвечает как Telegram, считает вызовы по методам,
+    опционально добавляет сетевую задержку
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.error_replies = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None):
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(name, params)}).encode("utf-8")
+
+    def _result(self, name: str, params: Dict[str, Any]) -> Any:
+        if name == "getMe":
+            return BOT_USER
+        if name in ("sendMessage", "editMessageText"):
+            text = params.get("text", "")
+            if name == "sendMessage" and text.startswith("❌"):
+                self.error_replies += 1
+            message_id = params.get("message_id") or next(self._message_ids)
+            return {"message_id": message_id, "date": int(time.time()), "from": BOT_USER,
+                    "chat": {"id": params.get("chat_id"), "type": "private"}, "text": text}
+        return True
+
+
+class LoadRun:
+    """
+    Один прогон: пользователи с разнесенным стартом, каждый выполняет свой сценарий
+    """
+
+    def __init__(self, bot, application, args):
+        self.bot = bot
+        self.application = application
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.update_ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Counter = Counter()
+        self.loop_lag: List[float] = []
+
+    def make_update(self, user_id: int, text: str) -> Update:
+        update_id = next(self.update_ids)
+        message = {
+            "message_id": update_id, "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": update_id, "message": message}, self.application.bot)
+
+    def pick_action(self) -> (str, str):
+        kind = self.rng.choice(self.args.mix)
+        if kind == "analyze":
+            return kind, f"/analyze {self.rng.choice(ANALYZE_TOPICS)}"
+        if kind == "text":
+            return kind, self.rng.choice(FREE_TEXT)
+        return kind, f"/{kind}"
+
+    async def on_processed(self, update: Update, context) -> None:
+        """Последняя группа обработчиков: апдейт полностью обработан"""
+        future = self.pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def user(self, index: int) -> None:
+        await asyncio.sleep(self.args.ramp * index / max(self.args.users, 1))
+        user_id = 1000 + index
+        for _ in range(self.args.actions):
+            kind, text = self.pick_action()
+            update = self.make_update(user_id, text)
+            future = asyncio.get_running_loop().create_future()
+            self.pending[update.update_id] = future
+            started = time.perf_counter()
+            await self.application.update_queue.put(update)
+            try:
+                finished = await asyncio.wait_for(future, timeout=self.args.timeout)
+            except asyncio.TimeoutError:
+                self.pending.pop(update.update_id, None)
+                self.timeouts[kind] += 1
+            else:
+                self.latencies[kind].append(finished - started)
+            if self.args.think:
+                await asyncio.sleep(self.rng.uniform(0, self.args.think))
+
+    async def monitor_loop(self, stop: asyncio.Event) -> None:
+        """Лаг event loop: насколько позже запланированного просыпается sleep"""
+        loop = asyncio.get_running_loop()
+        interval = self.args.lag_interval
+        while not stop.is_set():
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(loop.time() - started - interval, 0.0))
+
+    async def run(self) -> float:
+        self.application.add_handler(TypeHandler(Update, self.on_processed), group=100)
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_loop(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(self.user(index) for index in range(self.args.users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        return elapsed
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+async def run_load(args, bot) -> Dict[str, Any]:
+    fake_request = FakeBotRequest(latency=args.bot_api_latency)
+    application = bot.build_application("100000:BENCH", request=fake_request,
+                                         concurrent_updates=args.concurrent_updates)
+    load = LoadRun(bot, application, args)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    async with application:
+        await bot.on_startup(application)
+        await application.start()
+        try:
+            elapsed = await load.run()
+        finally:
+            await application.stop()
+            await bot.on_shutdown(application)
+
+    peak_alloc = None
+    if args.tracemalloc:
+        peak_alloc = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+
+    total = sum(len(values) for values in load.latencies.values())
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "elapsed_s": round(elapsed, 2),
+        "completed": total,
+        "throughput_ops": round(total / elapsed, 2) if elapsed else 0.0,
+        "timeouts": dict(load.timeouts),
+        "error_replies": fake_request.error_replies,
+        "commands": {kind: distribution(values) for kind, values in sorted(load.latencies.items())},
+        "event_loop_lag": distribution(load.loop_lag),
+        "bot_api_calls": dict(fake_request.calls),
+        "memory": {
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "max_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+            "peak_alloc_kb": peak_alloc,
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков Telegram бота")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд стартуют все пользователи")
+    parser.add_argument("--actions", type=int, default=3, help="действий на пользователя")
+    parser.add_argument("--think", type=float, default=1.0, help="макс. пауза между действиями (сек)")
+    parser.add_argument("--mix", default="trends,create,analyze,text",
+                        help="команды через запятую (повтор = больший вес)")
+    parser.add_argument("--concurrent-updates", type=int, default=64,
+                        help="параллельных апдейтов (1 - последовательная очередь PTB)")
+    parser.add_argument("--serial", action="store_true",
+                        help="дополнительно прогнать с --concurrent-updates 1 и вывести оба режима")
+    parser.add_argument("--timeout", type=float, default=180.0, help="таймаут одного действия (сек)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="множитель задержек стенда")
+    parser.add_argument("--bot-api-latency", type=float, default=0.03)
+    parser.add_argument("--http-concurrency", type=int, default=32,
+                        help="лимит одновременных запросов агента к стенду")
+    parser.add_argument("--stream-edit-interval", type=float, default=None)
+    parser.add_argument("--no-response-cache", action="store_true")
+    parser.add_argument("--prefetch", action="store_true", help="включить фоновое обновление трендов")
+    parser.add_argument("--lag-interval", type=float, default=0.05)
+    parser.add_argument("--tracemalloc", action="store_true", help="пик выделенной памяти (медленнее)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    args.mix = [kind.strip() for kind in args.mix.split(",") if kind.strip()]
+
+    with StubServer(StubConfig(latency_scale=args.latency_scale)) as stub, \
+            tempfile.TemporaryDirectory() as workdir:
+        # Конфигурация бота читается из окружения при импорте модуля
+        os.environ.update({
+            "ANTHROPIC_API_KEY": "bench-key",
+            "ANTHROPIC_BASE_URL": stub.anthropic_base_url,
+            "CACHE_DIR": os.path.join(workdir, "cache"),
+            "DATA_DIR": os.path.join(workdir, "data"),
+            "METRICS_PORT": "0",
+            "TREND_PREFETCH_ENABLED": "1" if args.prefetch else "0",
+            "RESPONSE_CACHE_ENABLED": "0" if args.no_response_cache else "1",
+        })
+        if args.stream_edit_interval is not None:
+            os.environ["STREAM_EDIT_INTERVAL"] = str(args.stream_edit_interval)
+
+        import telegram_bot as bot
+        from feed_cache import FeedCache
+        from http_client import HttpClient
+        from trend_prefetcher import TrendSnapshot
+
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+        stub.configure_agent(bot.agent)
+        bot.agent.http = HttpClient(host_limits={}, default_concurrency=args.http_concurrency,
+                                    pool_maxsize=args.http_concurrency, max_retries=0)
+
+        modes = {"concurrent": args.concurrent_updates}
+        if args.serial:
+            modes["serial"] = 1
+        reports = {}
+        for mode, concurrent_updates in modes.items():
+            # Каждый режим с холодными кэшами и пустыми сессиями
+            bot.response_cache.clear()
+            bot.agent.tool_cache.clear()
+            bot.agent.hn_item_cache.clear()
+            bot.agent.feed_cache = FeedCache(None, ttl_seconds=bot.agent.feed_cache.ttl_seconds)
+            bot.agent.trend_snapshot = TrendSnapshot()
+            bot.sessions = bot.SessionManager(max_sessions=bot.MAX_SESSIONS, ttl_seconds=bot.SESSION_TTL_SECONDS)
+            stub.requests.clear()
+            run_args = argparse.Namespace(**{**vars(args), "concurrent_updates": concurrent_updates})
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                reports[mode] = asyncio.run(run_load(run_args, bot))
+            reports[mode]["stub_requests"] = dict(stub.requests)
+        report = reports["concurrent"] if len(reports) == 1 else reports
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+Офлайн бенчмарки агента на локальном стенде.
+
+    python -m benchmarks.run                       # все сценарии, результат в .cache/bench.json
+    python -m benchmarks.run --only chat_tool_loop --iterations 50
+    python -m benchmarks.run --compare benchmarks/baseline.json     # регрессии относительно базы
+    python -m benchmarks.run --update-baseline     # перезаписать benchmarks/baseline.json
+
+Для каждого сценария: p50/p95/mean латентности, пропускная способность (оп/с)
+и пик выделенной памяти (tracemalloc, отдельный короткий прогон).
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.stubs import StubConfig, StubServer
+from cache import TTLCache
+from feed_cache import FeedCache
+from http_client import HttpClient
+from linkedin_agent import LinkedInAgent
+from trend_prefetcher import TrendSnapshot
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_OUTPUT = os.path.join(os.getenv("CACHE_DIR", ".cache"), "bench.json")
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def build_agent(stub: StubServer, store_dir: str) -> LinkedInAgent:
+    """
+    Агент, у которого все внешние сервисы указывают на стенд
+    """
+    agent = LinkedInAgent(
+        "bench-key",
+        "bench-token",
+        industry="product management",
+        target_audience="Product Managers",
+        feed_cache_ttl=0,
+        # Лимиты реальных хостов к стенду не относятся
+        http_client=HttpClient(host_limits={}, max_retries=0, pool_maxsize=64),
+        trend_store_path=os.path.join(store_dir, "trends.sqlite3"),
+        anthropic_base_url=stub.anthropic_base_url,
+    )
+    stub.configure_agent(agent)
+    return agent
+
+
+def reset_network_caches(agent: LinkedInAgent) -> None:
+    """
+    Холодный старт: без кэша фидов, историй HN, результатов инструментов и снимка
+    """
+    agent.feed_cache = FeedCache(None, ttl_seconds=0)
+    agent.hn_item_cache = TTLCache(max_size=2000, ttl_seconds=24 * 3600)
+    agent.tool_cache.clear()
+    agent.trend_snapshot = TrendSnapshot()
+
+
+class Scenario:
+    def __init__(self, name: str, run: Callable[[], Any],
+                 setup: Optional[Callable[[], None]] = None, warmup: int = 1):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: None)
+        self.warmup = warmup
+
+
+def scenarios(agent: LinkedInAgent) -> List[Scenario]:
+    keywords_input = json.dumps(agent.get_product_trends()["data"], ensure_ascii=False)
+
+    def chat() -> str:
+        return agent.chat("Покажи топ-5 трендов для PM", history=[])
+
+    return [
+        Scenario("parse_rss_feeds",
+                 lambda: agent.parse_rss_feeds("product_management", limit=10),
+                 setup=lambda: reset_network_caches(agent)),
+        # Кэш фидов устарел, сервер отвечает 304 - путь без парсинга
+        Scenario("parse_rss_feeds_revalidate",
+                 lambda: agent.parse_rss_feeds("product_management", limit=10)),
+        Scenario("get_product_trends",
+                 agent.get_product_trends,
+                 setup=lambda: reset_network_caches(agent)),
+        Scenario("get_product_trends_snapshot", agent.get_product_trends),
+        Scenario("analyze_trending_keywords",
+                 lambda: agent.analyze_trending_keywords(keywords_input)),
+        Scenario("chat_tool_loop", chat, setup=lambda: reset_network_caches(agent)),
+    ]
+
+
+def measure(scenario: Scenario, iterations: int, concurrency: int,
+            memory_iterations: int) -> Dict[str, Any]:
+    for _ in range(scenario.warmup):
+        scenario.setup()
+        scenario.run()
+
+    def timed() -> float:
+        scenario.setup()
+        started = time.perf_counter()
+        scenario.run()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(lambda _: timed(), range(iterations)))
+    else:
+        latencies = [timed() for _ in range(iterations)]
+    wall = time.perf_counter() - started
+
+    # Память отдельным прогоном: tracemalloc заметно замедляет код
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(memory_iterations):
+        scenario.setup()
+        scenario.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "min_ms": round(min(latencies) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "throughput_ops": round(iterations / wall, 2) if wall else 0.0,
+        "peak_alloc_kb": round(peak / 1024, 1),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """
+    Печатает изменения p50/p95 относительно базовой линии, возвращает число регрессий
+    """
+    regressions = 0
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            print(f"{name}: нет в базовой линии")
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms"):
+            delta = (result[key] - base[key]) / base[key] if base[key] else 0.0
+            changes.append(f"{key} {base[key]} -> {result[key]} ({delta:+.0%})")
+            if delta > threshold:
+                regressions += 1
+        print(f"{name}: " + ", ".join(changes))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарки LinkedIn агента")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--memory-iterations", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="имена сценариев")
+    parser.add_argument("--feeds", type=int, default=5)
+    parser.add_argument("--rss-items", type=int, default=20)
+    parser.add_argument("--hn-stories", type=int, default=30)
+    parser.add_argument("--reddit-posts", type=int, default=25)
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="множитель задержек стенда (0 - без задержек)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"записать результат в {os.path.relpath(BASELINE)}")
+    parser.add_argument("--compare", help="базовая линия для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="рост латентности, считающийся регрессией")
+    args = parser.parse_args(argv)
+    if args.update_baseline:
+        args.output = BASELINE
+
+    # Базу читаем до прогона и никогда не перезаписываем ею же сравниваемым результатом
+    baseline = None
+    if args.compare:
+        if os.path.exists(args.output) and os.path.samefile(args.output, args.compare):
+            parser.error("--output совпадает с --compare: результат перезаписал бы базовую линию")
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    logging.basicConfig(level=logging.WARNING)
+    config = StubConfig(feeds=args.feeds, rss_items=args.rss_items, hn_stories=args.hn_stories,
+                        reddit_posts=args.reddit_posts, latency_scale=args.latency_scale)
+
+    results: Dict[str, Any] = {}
+    with StubServer(config) as stub, tempfile.TemporaryDirectory() as store_dir:
+        # Агент печатает вызовы инструментов - в бенчмарке это только шум
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            agent = build_agent(stub, store_dir)
+            selected = [scenario for scenario in scenarios(agent)
+                        if not args.only or scenario.name in args.only]
+            for scenario in selected:
+                results[scenario.name] = measure(scenario, args.iterations, args.concurrency,
+                                                 args.memory_iterations)
+                print(f"{scenario.name}: p50 {results[scenario.name]['p50_ms']}ms, "
+                      f"p95 {results[scenario.name]['p95_ms']}ms", file=sys.stderr)
+        stub_requests = dict(stub.requests)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "compare", "threshold", "update_baseline")},
+            "stub_latency_s": config.latency,
+            "stub_requests": stub_requests,
+        },
+        "scenarios": results,
+    }
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {args.output}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"⚠️ Регрессий: {regressions}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
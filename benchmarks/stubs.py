@@ -0,0 +1,428 @@
+"""
+Локальный стенд вместо всех внешних сервисов агента: RSS/Atom фиды, HN Firebase,
+Reddit JSON, LinkedIn ugcPosts, Messages API с заранее заданным сценарием tool_use
+и Message Batches API (batch завершается через batch_delay секунд).
+Один HTTP сервер в фоновом потоке, маршруты по префиксу пути.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import fixtures
+
+# Задержки ответа по сервисам (сек) - порядок реальных значений, масштабируется
+DEFAULT_LATENCY = {
+    "rss": 0.04,
+    "hn": 0.02,
+    "reddit": 0.06,
+    "linkedin": 0.05,
+    "anthropic": 0.3,
+}
+
+# Сценарий модели по умолчанию: два хода с инструментами и финальный текст
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {"text": "Соберу данные по трендам.", "tools": [
+        ["get_product_trends", {}],
+        ["validate_topic_relevance", {"topic": "AI in product discovery 2025"}],
+    ]},
+    {"tools": [
+        ["analyze_trending_keywords", {"sources_data": json.dumps({"titles": [
+            "AI in product discovery", "Retention metrics for B2B SaaS", "Product-led growth playbook"
+        ]})}],
+    ]},
+    {"text": "ТОП-5 ТРЕНДОВ\n\n" + "\n\n".join(
+        f"{index}. {topic} - короткое описание тренда для PM аудитории"
+        for index, topic in enumerate(fixtures.TOPICS[:5], 1)
+    )},
+]
+
+
+class StubConfig:
+    """
+    Параметры стенда: размеры фикстур, задержки и сценарий модели
+    """
+
+    def __init__(self, feeds: int = 5, rss_items: int = 20, hn_stories: int = 30,
+                 reddit_posts: int = 25, latency: Optional[Dict[str, float]] = None,
+                 latency_scale: float = 1.0, script: Optional[List[Dict[str, Any]]] = None,
+                 stream_chunk: int = 40, stream_delay: float = 0.005, etag: bool = True,
+                 batch_delay: float = 2.0, batch_error_every: int = 0):
+        self.feeds = feeds
+        self.rss_items = rss_items
+        self.hn_stories = hn_stories
+        self.reddit_posts = reddit_posts
+        self.latency = {name: value * latency_scale
+                        for name, value in dict(DEFAULT_LATENCY, **(latency or {})).items()}
+        self.script = script or DEFAULT_SCRIPT
+        self.stream_chunk = stream_chunk
+        self.stream_delay = stream_delay * latency_scale
+        self.etag = etag
+        self.batch_delay = batch_delay * latency_scale
+        # Каждый N-й запрос batch'а завершается ошибкой (0 - без ошибок)
+        self.batch_error_every = batch_error_every
+
+
+class StubServer:
+    """
+    Стенд на 127.0.0.1 со свободным портом.
+    Адреса для агента: rss_urls, hn_api_url, reddit_url, linkedin_api_url, anthropic_base_url.
+    """
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._message_ids = 0
+        self._cached_prefixes = set()
+        self._posts = 0
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._feeds = {}
+        for index in range(self.config.feeds):
+            # Каждый третий фид - Atom, как у части реальных источников
+            if index % 3 == 2:
+                self._feeds[f"/rss/feed{index}.atom"] = fixtures.atom_feed(f"feed{index}", self.config.rss_items)
+            else:
+                self._feeds[f"/rss/feed{index}.xml"] = fixtures.rss_feed(f"feed{index}", self.config.rss_items)
+        self._stories = fixtures.hn_stories(self.config.hn_stories)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # --- жизненный цикл
+
+    def start(self) -> "StubServer":
+        stub = self
+
+        class Handler(_StubHandler):
+            server_stub = stub
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        # Стенд должен держать сотни одновременных соединений (нагрузочные прогоны)
+        self._server.request_queue_size = 512
+        threading.Thread(target=self._server.serve_forever, name="bench-stubs", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def rss_urls(self) -> List[str]:
+        return [self.url + path for path in self._feeds]
+
+    @property
+    def hn_api_url(self) -> str:
+        return f"{self.url}/hn/v0"
+
+    @property
+    def reddit_url(self) -> str:
+        return f"{self.url}/reddit"
+
+    @property
+    def linkedin_api_url(self) -> str:
+        return f"{self.url}/linkedin/v2"
+
+    @property
+    def anthropic_base_url(self) -> str:
+        return f"{self.url}/anthropic"
+
+    def configure_agent(self, agent) -> None:
+        """
+        Направляет все внешние обращения агента на стенд
+        """
+        agent.rss_feeds = {name: list(self.rss_urls) for name in agent.rss_feeds}
+        agent.hn_api_url = self.hn_api_url
+        agent.reddit_url = self.reddit_url
+        agent.linkedin_api_url = self.linkedin_api_url
+
+    # --- маршруты
+
+    def route(self, method: str, path: str, headers, body: bytes, query: str = ""):
+        """
+        Возвращает (status, headers, body) или генератор чанков для SSE
+        """
+        if path.startswith("/rss/"):
+            return self._rss(path, headers)
+        if path.startswith("/hn/"):
+            return self._hn(path)
+        if path.startswith("/reddit/"):
+            return self._reddit(path, query)
+        if path.startswith("/linkedin/"):
+            return self._linkedin(method, path)
+        if path.startswith("/anthropic/v1/messages/batches"):
+            return self._batch_route(method, path, body)
+        if path.startswith("/anthropic/v1/messages") and method == "POST":
+            return self._messages(json.loads(body or b"{}"))
+        return 404, {}, b"not found"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.requests[name] += 1
+
+    def _rss(self, path: str, headers):
+        self._count("rss")
+        body = self._feeds.get(path)
+        if body is None:
+            return 404, {}, b""
+        time.sleep(self.config.latency["rss"])
+        response_headers = {"Content-Type": "application/rss+xml; charset=utf-8"}
+        if self.config.etag:
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if headers.get("If-None-Match") == etag:
+                return 304, {"ETag": etag}, b""
+            response_headers["ETag"] = etag
+        return 200, response_headers, body
+
+    def _hn(self, path: str):
+        self._count("hn")
+        time.sleep(self.config.latency["hn"])
+        if path.endswith("/topstories.json"):
+            return _json(200, list(self._stories))
+        match = re.search(r"/item/(\d+)\.json$", path)
+        if match:
+            return _json(200, self._stories.get(int(match.group(1))))
+        return 404, {}, b""
+
+    def _reddit(self, path: str, query: str = ""):
+        self._count("reddit")
+        time.sleep(self.config.latency["reddit"])
+        match = re.match(r"/reddit/r/([^/]+)/top\.json$", path)
+        if not match:
+            return 404, {}, b""
+        # Как Reddit: limit из запроса (по умолчанию 25), не больше, чем есть постов
+        limit = parse_qs(query).get("limit", ["25"])[0]
+        count = min(int(limit) if limit.isdigit() else 25, self.config.reddit_posts)
+        return _json(200, fixtures.reddit_listing(match.group(1), count))
+
+    def _linkedin(self, method: str, path: str):
+        self._count("linkedin")
+        time.sleep(self.config.latency["linkedin"])
+        if path.endswith("/userinfo"):
+            return _json(200, {"sub": "bench-user", "name": "Bench User"})
+        if path.endswith("/ugcPosts") and method == "POST":
+            with self._lock:
+                self._posts += 1
+                post_id = f"urn:li:share:{self._posts}"
+            status, headers, body = _json(201, {"id": post_id})
+            headers["X-RestLi-Id"] = post_id
+            return status, headers, body
+        return 404, {}, b""
+
+    # --- Messages API
+
+    @staticmethod
+    def _step_index(messages: List[Dict[str, Any]]) -> int:
+        """
+        Номер шага сценария = число ответов ассистента после последнего
+        обычного сообщения пользователя (не tool_result)
+        """
+        step = 0
+        for message in reversed(messages):
+            content = message.get("content")
+            if message.get("role") == "assistant":
+                step += 1
+                continue
+            is_tool_result = isinstance(content, list) and any(
+                isinstance(block, dict) and block.get("type") == "tool_result" for block in content
+            )
+            if not is_tool_result:
+                break
+        return step
+
+    def _messages(self, request: Dict[str, Any]):
+        self._count("anthropic")
+        script = self.config.script
+        step = script[min(self._step_index(request.get("messages", [])), len(script) - 1)]
+        with self._lock:
+            self._message_ids += 1
+            message_id = f"msg_bench_{self._message_ids}"
+
+        content = []
+        if step.get("text"):
+            content.append({"type": "text", "text": step["text"]})
+        for index, (name, tool_input) in enumerate(step.get("tools", [])):
+            content.append({"type": "tool_use", "id": f"toolu_{message_id}_{index}",
+                            "name": name, "input": tool_input})
+
+        # Эмуляция prompt caching: префикс считается закэшированным со второго запроса
+        prefix = json.dumps([request.get("system"), request.get("tools")], sort_keys=True)
+        prefix_tokens = len(prefix) // 4
+        with self._lock:
+            cached = prefix in self._cached_prefixes
+            self._cached_prefixes.add(prefix)
+        usage = {
+            "input_tokens": len(json.dumps(request.get("messages", []))) // 4,
+            "output_tokens": max(len(json.dumps(content)) // 4, 1),
+            "cache_creation_input_tokens": 0 if cached else prefix_tokens,
+            "cache_read_input_tokens": prefix_tokens if cached else 0,
+        }
+        message = {
+            "id": message_id, "type": "message", "role": "assistant",
+            "model": request.get("model", "claude-bench"), "content": content,
+            "stop_reason": "tool_use" if step.get("tools") else "end_turn",
+            "stop_sequence": None, "usage": usage,
+        }
+
+        time.sleep(self.config.latency["anthropic"])
+        if request.get("stream"):
+            return 200, {"Content-Type": "text/event-stream"}, self._sse(message)
+        return _json(200, message)
+
+    # --- Message Batches API
+
+    def _batch_route(self, method: str, path: str, body: bytes):
+        self._count("anthropic_batches")
+        if method == "POST" and path.rstrip("/").endswith("/batches"):
+            return self._create_batch(json.loads(body or b"{}"))
+        match = re.match(r"/anthropic/v1/messages/batches/([^/]+)(/results)?$", path)
+        if not match or match.group(1) not in self._batches:
+            return _json(404, {"type": "error", "error": {"type": "not_found_error", "message": "batch not found"}})
+        batch_id, results = match.group(1), match.group(2)
+        if results:
+            return self._batch_results(batch_id)
+        return _json(200, self._batch_object(batch_id))
+
+    def _create_batch(self, request: Dict[str, Any]):
+        with self._lock:
+            batch_id = f"msgbatch_bench_{len(self._batches) + 1}"
+            self._batches[batch_id] = {"created_at": time.time(), "requests": request.get("requests", [])}
+        return _json(200, self._batch_object(batch_id))
+
+    def _batch_object(self, batch_id: str) -> Dict[str, Any]:
+        batch = self._batches[batch_id]
+        total = len(batch["requests"])
+        ended = time.time() - batch["created_at"] >= self.config.batch_delay
+        every = self.config.batch_error_every
+        errored = (total // every) if ended and every else 0
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(batch["created_at"]))
+        return {
+            "id": batch_id, "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else total,
+                "succeeded": total - errored if ended else 0,
+                "errored": errored, "canceled": 0, "expired": 0,
+            },
+            "created_at": created, "expires_at": created, "ended_at": created if ended else None,
+            "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"{self.anthropic_base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _batch_results(self, batch_id: str):
+        lines = []
+        every = self.config.batch_error_every
+        for index, request in enumerate(self._batches[batch_id]["requests"], 1):
+            if every and index % every == 0:
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": "overloaded_error", "message": "Overloaded"}}}
+            else:
+                params = request.get("params", {})
+                prompt = params.get("messages", [{}])[-1].get("content", "")
+                if isinstance(prompt, list):
+                    prompt = prompt[-1].get("text", "")
+                text = f"ЧЕРНОВИК\n\n{prompt[:200]}\n\n" + "\n\n".join(
+                    f"✅ {topic}" for topic in fixtures.TOPICS[index % 5:index % 5 + 3]
+                )
+                result = {"type": "succeeded", "message": {
+                    "id": f"msg_{batch_id}_{index}", "type": "message", "role": "assistant",
+                    "model": params.get("model", "claude-bench"),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn", "stop_sequence": None,
+                    "usage": {"input_tokens": len(json.dumps(params)) // 4,
+                              "output_tokens": len(text) // 4,
+                              "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0},
+                }}
+            lines.append(json.dumps({"custom_id": request.get("custom_id"), "result": result},
+                                    ensure_ascii=False))
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        return 200, {"Content-Type": "application/binary"}, body
+
+    def _sse(self, message: Dict[str, Any]):
+        def event(name: str, data: Dict[str, Any]) -> bytes:
+            return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        start = dict(message, content=[], stop_reason=None,
+                     usage=dict(message["usage"], output_tokens=1))
+        yield event("message_start", {"type": "message_start", "message": start})
+        chunk = self.config.stream_chunk
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                yield event("content_block_start", {"type": "content_block_start", "index": index,
+                                                    "content_block": {"type": "text", "text": ""}})
+                for offset in range(0, len(block["text"]), chunk):
+                    time.sleep(self.config.stream_delay)
+                    yield event("content_block_delta", {
+                        "type": "content_block_delta", "index": index,
+                        "delta": {"type": "text_delta", "text": block["text"][offset:offset + chunk]}
+                    })
+            else:
+                yield event("content_block_start", {"type": "content_block_start", "index": index,
+                                                    "content_block": dict(block, input={})})
+                yield event("content_block_delta", {
+                    "type": "content_block_delta", "index": index,
+                    "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}
+                })
+            yield event("content_block_stop", {"type": "content_block_stop", "index": index})
+        yield event("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+            "usage": {"output_tokens": message["usage"]["output_tokens"]}
+        })
+        yield event("message_stop", {"type": "message_stop"})
+
+
+def _json(status: int, payload: Any):
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server_stub: StubServer = None
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        status, headers, payload = self.server_stub.route(
+            self.command, parts.path, self.headers, body, parts.query
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if isinstance(payload, bytes):
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        # SSE: чанки без Content-Length, соединение закрывается в конце
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for chunk in payload:
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args) -> None:
+        pass
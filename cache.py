@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU кэш с TTL на запись и ограничением размера
+    """
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Возвращает значение, если запись есть и не протухла
+        """
+        value, _ = self.get_with_age(key)
+        return default if value is MISSING else value
+
+    def get_with_age(self, key: Hashable) -> Tuple[Any, Optional[float]]:
+        """
+        Возвращает (значение, возраст в секундах) или (MISSING, None)
+        """
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[2], now - item[1]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + ttl, now, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[0] > time.time()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,141 @@
+import hashlib
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Параметры, которые не меняют содержимое страницы
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "yclid", "mc_cid", "mc_eid", "ref", "ref_src", "ref_url",
+    "source", "share", "si", "igshid", "_hsenc", "_hsmi", "cmpid", "sr_share",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+HN_ITEM_RE = re.compile(r"^news\.ycombinator\.com/item$")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+SIMHASH_BITS = 64
+# Дубликаты: расстояние Хэмминга <= 3. 4 полосы по 16 бит -> хотя бы одна совпадет
+MAX_DISTANCE = 3
+BANDS = 4
+
+
+def canonicalize_url(url: str, resolve: Optional[Callable[[str], Optional[str]]] = None) -> str:
+    """
+    Приводит URL к каноническому виду: без трекинга, www, фрагмента и завершающего /.
+    resolve может заменить пермалинк (HN item, reddit) на целевую ссылку.
+    """
+    if not url:
+        return ""
+    if resolve is not None:
+        url = resolve(url) or url
+
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if host in ("old.reddit.com", "np.reddit.com"):
+        host = "reddit.com"
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    # http и https считаем одним адресом
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def hn_item_id(url: str) -> Optional[int]:
+    """
+    id истории из пермалинка news.ycombinator.com/item?id=N
+    """
+    parts = urlsplit(url)
+    host = parts.netloc.lower().removeprefix("www.")
+    if not HN_ITEM_RE.match(host + parts.path):
+        return None
+    params = dict(parse_qsl(parts.query))
+    return int(params["id"]) if params.get("id", "").isdigit() else None
+
+
+def simhash(text: str) -> int:
+    """
+    64-битный SimHash по словам и биграммам заголовка
+    """
+    words = [w.lower() for w in WORD_RE.findall(text)]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+
+    vector = [0] * SIMHASH_BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            vector[bit] += 1 if value >> bit & 1 else -1
+
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if vector[bit] > 0)
+
+
+def _bands(value: int) -> List[Tuple[int, int]]:
+    width = SIMHASH_BITS // BANDS
+    mask = (1 << width) - 1
+    return [(band, value >> (band * width) & mask) for band in range(BANDS)]
+
+
+def deduplicate(groups: Dict[str, List[Dict[str, Any]]],
+                source_of: Callable[[str, Dict[str, Any]], str],
+                resolve: Optional[Callable[[str], Optional[str]]] = None
+                ) -> Tuple[Dict[str, List[Dict[str, Any]]], int]:
+    """
+    Убирает дубликаты между группами (rss/reddit/hn) и внутри них.
+    Дубликат - тот же канонический URL или почти одинаковый заголовок (SimHash).
+    Остается первый встреченный элемент, в него сливаются sources, score и comments
+    (поле sources есть только у элементов, собранных из нескольких источников).
+    Возвращает (новые группы, число удаленных дубликатов).
+    """
+    by_url: Dict[str, Dict[str, Any]] = {}
+    by_band: Dict[Tuple[int, int], List[Tuple[int, Dict[str, Any]]]] = {}
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    removed = 0
+
+    for group, items in groups.items():
+        kept = []
+        for item in items:
+            source = source_of(group, item)
+            url = canonicalize_url(item.get("target_url") or item.get("link") or item.get("url", ""), resolve)
+            fingerprint = simhash(item.get("title", ""))
+
+            original = by_url.get(url) if url else None
+            if original is None and fingerprint:
+                for band in _bands(fingerprint):
+                    for other_hash, other in by_band.get(band, []):
+                        if bin(fingerprint ^ other_hash).count("1") <= MAX_DISTANCE:
+                            original = other
+                            break
+                    if original is not None:
+                        break
+
+            if original is not None:
+                if source not in original["sources"]:
+                    original["sources"].append(source)
+                for field in ("score", "comments"):
+                    if item.get(field):
+                        original[field] = original.get(field, 0) + item[field]
+                removed += 1
+                continue
+
+            merged = dict(item, sources=[source])
+            kept.append(merged)
+            if url:
+                by_url[url] = merged
+            if fingerprint:
+                for band in _bands(fingerprint):
+                    by_band.setdefault(band, []).append((fingerprint, merged))
+        result[group] = kept
+
+    # Список источников нужен только у объединенных элементов - экономим токены
+    for items in result.values():
+        for item in items:
+            if len(item["sources"]) == 1:
+                del item["sources"]
+
+    return result, removed
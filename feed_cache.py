@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from json_file import load_json, save_json_atomic
+
+
+class FeedCache:
+    """
+    Кэш RSS фидов: ETag/Last-Modified и уже распарсенные статьи по URL фида.
+    - свежие записи (моложе ttl_seconds) отдаются без сети
+    - устаревшие перепроверяются условным запросом, 304 не требует парсинга
+    - при заданном path кэш переживает рестарт процесса (JSON на диске)
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.stats = {"fresh_hits": 0, "not_modified": 0, "fetched": 0}
+        self._load()
+
+    def _load(self) -> None:
+        self._entries = load_json(self.path, {}, label="кэш фидов")
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(url)
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return bool(entry) and time.time() - entry["checked_at"] < self.ttl_seconds
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Заголовки условного GET для записи из кэша
+        """
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, articles: List[Dict[str, Any]],
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries[url] = {
+                "articles": articles,
+                "etag": etag,
+                "last_modified": last_modified,
+                "checked_at": time.time()
+            }
+            self._dirty = True
+            self.stats["fetched"] += 1
+
+    def touch(self, url: str) -> None:
+        """
+        Сервер ответил 304 - продлеваем свежесть записи
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                entry["checked_at"] = time.time()
+                self._dirty = True
+            self.stats["not_modified"] += 1
+
+    def record_fresh_hit(self) -> None:
+        with self._lock:
+            self.stats["fresh_hits"] += 1
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет кэш на диск (если что-то изменилось)
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+
+        save_json_atomic(self.path, data, lock=self._save_lock, label="кэш фидов")
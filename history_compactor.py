@@ -0,0 +1,189 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+# Грубая оценка: ~3 символа на токен (смесь кириллицы, латиницы и JSON)
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(value: Any) -> int:
+    """
+    Приблизительно оценивает количество токенов в сообщении/блоке
+    """
+    if isinstance(value, str):
+        text = value
+    else:
+        text = json.dumps(value, ensure_ascii=False, default=str)
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def block_to_dict(block: Any) -> Dict[str, Any]:
+    """
+    Приводит блок контента (dict или объект SDK) к обычному dict
+    """
+    if isinstance(block, dict):
+        return block
+    return block.model_dump(exclude_none=True)
+
+
+def content_to_blocks(content: Any) -> List[Dict[str, Any]]:
+    """
+    Приводит content сообщения к списку dict-блоков
+    """
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return [block_to_dict(block) for block in content]
+
+
+def _is_turn_start(message: Dict[str, Any]) -> bool:
+    """
+    Ход начинается с user сообщения, которое не является ответом инструментов
+    """
+    if message["role"] != "user":
+        return False
+    if isinstance(message["content"], str):
+        return True
+    return not any(block_to_dict(b).get("type") == "tool_result" for b in message["content"])
+
+
+def _collect_titles(value: Any, titles: List[str], limit: int) -> None:
+    """
+    Рекурсивно собирает поля title из результата инструмента
+    """
+    if len(titles) >= limit:
+        return
+    if isinstance(value, dict):
+        title = value.get("title")
+        if isinstance(title, str) and title:
+            titles.append(title[:80])
+        for item in value.values():
+            _collect_titles(item, titles, limit)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_titles(item, titles, limit)
+
+
+class HistoryCompactor:
+    """
+    Держит запрос к Claude в пределах бюджета токенов.
+
+    Последние keep_recent_turns ходов (и текущий ход) остаются дословными.
+    Для старых ходов по очереди применяется:
+    1. tool_result заменяются короткой выжимкой (заголовки)
+    2. завершенные обмены tool_use/tool_result сворачиваются в заметку
+    3. самые старые ходы удаляются целиком
+    """
+
+    def __init__(self, token_budget: int = 12000, keep_recent_turns: int = 2,
+                 summary_titles: int = 5):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_titles = summary_titles
+
+    def compact(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Возвращает (сжатые сообщения, сэкономлено токенов)
+        """
+        before = estimate_tokens(messages)
+        if before <= self.token_budget:
+            return messages, 0
+
+        turns = self._split_turns(messages)
+        protected = max(self.keep_recent_turns + 1, 1)
+        old, recent = turns[:-protected], turns[-protected:]
+
+        stages = (self._summarize_tool_results, self._collapse_tool_exchanges)
+        for stage in stages:
+            old = [stage(turn) for turn in old]
+            if self._total(old, recent) <= self.token_budget:
+                break
+
+        while old and self._total(old, recent) > self.token_budget:
+            old.pop(0)
+
+        compacted = [message for turn in old + recent for message in turn]
+        return compacted, max(before - estimate_tokens(compacted), 0)
+
+    @staticmethod
+    def _total(old: List[List[Dict[str, Any]]], recent: List[List[Dict[str, Any]]]) -> int:
+        return estimate_tokens([m for turn in old + recent for m in turn])
+
+    @staticmethod
+    def _split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Делит историю на ходы: user текст -> (tool_use/tool_result)* -> ответ
+        """
+        turns: List[List[Dict[str, Any]]] = []
+        for message in messages:
+            if not turns or _is_turn_start(message):
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    @staticmethod
+    def _tool_names(turn: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        tool_use_id -> имя инструмента
+        """
+        names = {}
+        for message in turn:
+            if message["role"] != "assistant" or isinstance(message["content"], str):
+                continue
+            for block in content_to_blocks(message["content"]):
+                if block.get("type") == "tool_use":
+                    names[block["id"]] = block["name"]
+        return names
+
+    def _summarize_result(self, tool_name: str, content: Any) -> str:
+        """
+        Короткая выжимка результата инструмента вместо полного JSON
+        """
+        titles: List[str] = []
+        try:
+            _collect_titles(json.loads(content), titles, self.summary_titles)
+        except (TypeError, ValueError):
+            pass
+        if titles:
+            return f"[{tool_name}: сжато, заголовки: {'; '.join(titles)}]"
+        return f"[{tool_name}: результат сжат]"
+
+    def _summarize_tool_results(self, turn: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        names = self._tool_names(turn)
+        result = []
+        for message in turn:
+            if message["role"] == "user" and not isinstance(message["content"], str):
+                blocks = []
+                for block in content_to_blocks(message["content"]):
+                    if block.get("type") == "tool_result":
+                        tool_name = names.get(block.get("tool_use_id"), "tool")
+                        block = dict(block, content=self._summarize_result(tool_name, block.get("content")))
+                    blocks.append(block)
+                message = {"role": "user", "content": blocks}
+            result.append(message)
+        return result
+
+    def _collapse_tool_exchanges(self, turn: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Оставляет только вопрос пользователя и финальный ответ,
+        промежуточные вызовы инструментов превращаются в заметку
+        """
+        if len(turn) < 3:
+            return turn
+
+        first, middle, last = turn[0], turn[1:-1], turn[-1]
+        if last["role"] != "assistant":
+            # Ход не завершен - tool_use без ответа сворачивать нельзя
+            return turn
+
+        notes = []
+        for message in middle:
+            if message["role"] != "user" or isinstance(message["content"], str):
+                continue
+            for block in content_to_blocks(message["content"]):
+                if block.get("type") == "tool_result":
+                    content = block.get("content")
+                    notes.append(content if isinstance(content, str) else "[результат]")
+
+        blocks = content_to_blocks(first["content"])
+        if notes:
+            blocks.append({"type": "text", "text": "(Контекст прошлого хода) " + " ".join(notes)})
+        return [{"role": "user", "content": blocks}, last]
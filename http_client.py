@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+# 429 безопасно повторять для любого метода - запрос не был обработан
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# host -> (макс. одновременных запросов, запросов в секунду; 0 = без лимита)
+DEFAULT_HOST_LIMITS: Dict[str, Tuple[int, float]] = {
+    "www.reddit.com": (2, 1.0),  # Reddit жестко троттлит анонимные запросы
+    "hacker-news.firebaseio.com": (16, 0),
+    "api.linkedin.com": (2, 2.0),
+}
+
+
+metrics.describe("http_request_seconds", "Длительность исходящего HTTP запроса (одна попытка)")
+metrics.describe("http_requests_total", "Исходящие HTTP запросы по хосту и статусу")
+metrics.describe("http_retries_total", "Повторы исходящих HTTP запросов")
+
+
+class HostLimiter:
+    """
+    Ограничение одновременных запросов и частоты запросов к одному хосту
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_second: float = 0):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + self._interval
+            if slot > now:
+                time.sleep(slot - now)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._semaphore.release()
+
+
+class HttpClient:
+    """
+    Общий HTTP клиент для всех источников:
+    - keep-alive пул соединений (одна requests.Session)
+    - лимиты конкурентности и частоты по хостам
+    - повторы с экспоненциальной задержкой на 429/5xx и сетевых ошибках
+    - таймаут по умолчанию на каждый запрос
+    """
+
+    def __init__(self, timeout: float = 10, max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 30, pool_maxsize: int = 20,
+                 host_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 default_concurrency: int = 8, user_agent: str = "LinkedInAgent/1.0"):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.default_concurrency = default_concurrency
+        self.host_limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._limiters_lock = threading.Lock()
+
+    def _limiter(self, host: str) -> HostLimiter:
+        with self._limiters_lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                concurrency, rps = self.host_limits.get(host, (self.default_concurrency, 0))
+                limiter = HostLimiter(concurrency, rps)
+                self._limiters[host] = limiter
+            return limiter
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Задержка перед повтором: Retry-After от сервера или экспонента
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+
+    def request(self, method: str, url: str, max_retries: Optional[int] = None,
+                **kwargs) -> requests.Response:
+        """
+        max_retries переопределяет число повторов для одного вызова: 0 - когда у вызывающего
+        свой таймаут на весь запрос, который повторы с задержками растянули бы в разы
+        """
+        method = method.upper()
+        kwargs.setdefault("timeout", self.timeout)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        host = urlsplit(url).netloc
+        limiter = self._limiter(host)
+
+        attempt = 0
+        while True:
+            try:
+                with limiter:
+                    # Время ожидания лимитера не входит в латентность хоста
+                    with metrics.timer("http_request_seconds", host=host):
+                        response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc("http_requests_total", host=host, status=type(e).__name__)
+                if method not in IDEMPOTENT_METHODS or attempt >= max_retries:
+                    raise
+                metrics.inc("http_retries_total", host=host)
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            metrics.inc("http_requests_total", host=host, status=response.status_code)
+            retryable = response.status_code == 429 or (
+                response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+            )
+            if not retryable or attempt >= max_retries:
+                return response
+
+            delay = self._backoff(attempt, response)
+            metrics.inc("http_retries_total", host=host)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,42 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path: Optional[str], default: Any, label: str = "файл") -> Any:
+    """
+    Читает JSON с диска; нет файла или он поврежден - default
+    """
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать {label} {path}: {e}")
+        return default
+
+
+def save_json_atomic(path: str, data: str, lock: Optional[threading.Lock] = None,
+                     label: str = "файл") -> bool:
+    """
+    Атомарно записывает уже сериализованный JSON: временный файл + os.replace,
+    чтобы читатель никогда не увидел половину файла
+    """
+    directory = os.path.dirname(path)
+    tmp_path = f"{path}.tmp"
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with lock or threading.Lock():
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logger.error(f"Не удалось сохранить {label} {path}: {e}")
+        return False
@@ -0,0 +1,157 @@
+import hashlib
+import html
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List
+
+TAG_RE = re.compile(r"<[^>]+>")
+URL_RE = re.compile(r"https?://\S+")
+# Фразы не переходят через знаки препинания
+CHUNK_RE = re.compile(r"[.,!?;:()\[\]{}\"«»“”|/\\\n\t]+|\s[-–—]\s")
+TOKEN_RE = re.compile(r"[A-Za-zА-Яа-яЁё0-9][A-Za-zА-Яа-яЁё0-9+#'’\-]*")
+
+STOPWORDS_EN = set("""
+a about above after again against all also am an and any are aren't as at be because been
+before being below between both but by can can't could did didn't do does doesn't doing don't
+down during each even ever every few for from further get gets got had has hasn't have haven't
+having he her here hers herself him himself his how however i i'm if in into is isn't it it's
+its itself just let's like made make makes many may me more most much must my myself new no nor
+not now of off on once one only or other our ours ourselves out over own really same say says
+she should so some still such than that that's the their theirs them themselves then there
+there's these they this those through to too under until up us use used using very via want
+was wasn't way we well were weren't what what's when where which while who whom why will with
+within without won't would you your yours yourself yourselves vs via yet
+""".split())
+
+STOPWORDS_RU = set("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже
+для до его ее её если есть еще ещё же за здесь и из или им их к как ко когда кто ли либо мне
+может мы на надо наш не него нее неё нет ни них но ну о об однако он она они оно от очень по
+под при с со так также такой там те тем то того тоже той только том ты у уже хотя чего чей
+чем что чтобы чье чья эта эти это этого этой этом этот я свой своя свои своих которые который
+которая которое можно нужно будет будут сейчас теперь раз вы весь всё всем всеми
+""".split())
+
+STOPWORDS = STOPWORDS_EN | STOPWORDS_RU
+
+
+def clean_text(text: str) -> str:
+    """
+    Убирает HTML теги, сущности и ссылки из RSS описаний
+    """
+    text = html.unescape(TAG_RE.sub(" ", text or ""))
+    return URL_RE.sub(" ", text)
+
+
+def _keep_token(token: str) -> bool:
+    """
+    Короткие токены оставляем только как аббревиатуры: AI, UX, PM, B2B
+    """
+    if token.isdigit():
+        return False
+    if len(token) >= 3:
+        return True
+    return len(token) == 2 and token.isupper()
+
+
+class KeywordEngine:
+    """
+    Извлечение ключевых слов и фраз (1-3 слова) с TF-IDF весом.
+    IDF считается по скользящему фоновому корпусу последних corpus_size
+    документов, который обновляется инкрементально - без пересчета с нуля.
+    Термины документа кэшируются в корпусе, поэтому повторный скоринг
+    сохраненных элементов сводится к подсчету по готовым множествам.
+    """
+
+    def __init__(self, corpus_size: int = 5000, max_ngram: int = 3):
+        self.corpus_size = corpus_size
+        self.max_ngram = max_ngram
+        self._doc_freq: Counter = Counter()
+        # ключ документа -> множество его терминов (он же кэш токенизации)
+        self._corpus: "OrderedDict[bytes, frozenset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def terms(self, text: str) -> List[str]:
+        """
+        Термины документа: слова и фразы без стоп-слов внутри
+        """
+        terms = []
+        for chunk in CHUNK_RE.split(clean_text(text)):
+            run: List[str] = []
+            # Фраза - непрерывная последовательность значимых слов
+            for token in TOKEN_RE.findall(chunk) + [""]:
+                token = token.strip("-'’")
+                if token and token.lower() not in STOPWORDS and _keep_token(token):
+                    run.append(token.lower())
+                    continue
+                for n in range(1, self.max_ngram + 1):
+                    terms.extend(" ".join(run[i:i + n]) for i in range(len(run) - n + 1))
+                run = []
+        return terms
+
+    def observe(self, documents: Iterable[str]) -> List[frozenset]:
+        """
+        Добавляет документы в фоновый корпус и возвращает их термины.
+        Уже известные документы не токенизируются повторно.
+        """
+        result = []
+        with self._lock:
+            for document in documents:
+                if not document:
+                    continue
+                key = hashlib.blake2b(document.encode("utf-8"), digest_size=8).digest()
+                doc_terms = self._corpus.get(key)
+                if doc_terms is None:
+                    doc_terms = frozenset(self.terms(document))
+                    self._corpus[key] = doc_terms
+                    self._doc_freq.update(doc_terms)
+                    if len(self._corpus) > self.corpus_size:
+                        self._forget_oldest()
+                result.append(doc_terms)
+        return result
+
+    def _forget_oldest(self) -> None:
+        _, old_terms = self._corpus.popitem(last=False)
+        for term in old_terms:
+            self._doc_freq[term] -= 1
+            if self._doc_freq[term] <= 0:
+                del self._doc_freq[term]
+
+    def top_keywords(self, documents: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Топ терминов по TF-IDF для набора документов (TF - число документов с термином).
+        Фразы получают бонус за длину, слова, целиком покрытые
+        выбранной фразой с той же частотой, не дублируются.
+        """
+        counts: Counter = Counter()
+        for doc_terms in self.observe(documents):
+            counts.update(doc_terms)
+
+        with self._lock:
+            total_docs = len(self._corpus) or 1
+            doc_freq = self._doc_freq
+            scored = []
+            for term, count in counts.items():
+                if count < 2 and " " in term:
+                    # Фраза, встретившаяся один раз - шум
+                    continue
+                idf = math.log((total_docs + 1) / (doc_freq.get(term, 0) + 1)) + 1
+                length_boost = 1 + 0.5 * term.count(" ")
+                scored.append((count * idf * length_boost, count, term))
+
+        scored.sort(reverse=True)
+        result: List[Dict[str, Any]] = []
+        for score, count, term in scored:
+            if any(f" {term} " in f" {kept['word']} "
+                   for kept in result if kept["count"] == count and " " in kept["word"]):
+                continue
+            result.append({"word": term, "count": count, "score": round(score, 2)})
+            if len(result) >= limit:
+                break
+        return result
+
+    def corpus_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"documents": len(self._corpus), "terms": len(self._doc_freq)}
@@ -1,11 +1,41 @@
 import anthropic
+import asyncio
+import calendar
+import logging
 import os
 import json
 import requests
-from typing import Dict, Any, List
+import threading
+import time
+import urllib3
+from typing import Dict, Any, List, Optional, Callable, Awaitable
 from datetime import datetime, timedelta
 import feedparser
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from cache import MISSING, TTLCache
+from dedup import deduplicate, hn_item_id
+from feed_cache import FeedCache
+from history_compactor import HistoryCompactor, content_to_blocks
+from http_client import RETRY_STATUSES, HttpClient
+from keywords import KeywordEngine
+from metrics import metrics
+from publish_queue import PublishQueue
+from singleflight import SingleFlight
+from tool_encoding import compact_tool_result
+from trend_prefetcher import TrendSnapshot
+from trend_store import WINDOWS, TrendStore
+from trend_velocity import TrendVelocity
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_request_seconds", "Длительность запроса к Messages API")
+metrics.describe("agent_tool_seconds", "Время выполнения инструмента (без попаданий в кэш)")
+metrics.describe("agent_tool_errors_total", "Инструменты, вернувшие ошибку или таймаут")
+metrics.describe("agent_turn_iterations", "Запросов к модели за один ход (цикл инструментов)",
+                 buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15))
+metrics.describe("llm_tokens_total", "Токены по response.usage")
+metrics.describe("cache_hits_total", "Попадания в кэши")
+metrics.describe("cache_misses_total", "Промахи кэшей")
 
 class LinkedInAgent:
     """
@@ -13,12 +43,54 @@ class LinkedInAgent:
     """
     
     def __init__(self, anthropic_api_key: str, linkedin_access_token: str, 
-                 industry: str = "технологии", target_audience: str = ""):
-        self.client = anthropic.Anthropic(api_key=anthropic_api_key)
+                 industry: str = "технологии", target_audience: str = "",
+                 history_token_budget: int = 12000,
+                 feed_cache_path: Optional[str] = None, feed_cache_ttl: float = 600,
+                 http_client: Optional[HttpClient] = None,
+                 trend_store_path: Optional[str] = None,
+                 anthropic_base_url: Optional[str] = None,
+                 publish_queue_path: Optional[str] = None,
+                 tool_workers: int = 32):
+        # base_url позволяет направить запросы на локальный стенд (бенчмарки)
+        self.client = anthropic.Anthropic(api_key=anthropic_api_key, base_url=anthropic_base_url)
+        self.async_client = anthropic.AsyncAnthropic(api_key=anthropic_api_key, base_url=anthropic_base_url)
+        self.model = "claude-sonnet-4-5-20250929"
+        self.max_tokens = 2048  # ОГРАНИЧИЛИ: было 4096
         self.linkedin_token = linkedin_access_token
         self.conversation_history = []
+        # Сжатие истории, чтобы запрос не рос с каждым ходом
+        self.history_compactor = HistoryCompactor(token_budget=history_token_budget)
+        self.compaction_stats = {"calls": 0, "compacted_calls": 0, "tokens_saved": 0}
+        # Prompt caching: системный промпт и инструменты одинаковы во всех запросах
+        self._prefix_cache = None
+        self._prefix_cache_key = None
+        self.cache_stats = {
+            "requests": 0, "hits": 0, "misses": 0,
+            "cache_read_tokens": 0, "cache_write_tokens": 0,
+            "input_tokens": 0, "output_tokens": 0
+        }
         self.industry = industry
         self.target_audience = target_audience
+        # Общий HTTP клиент: пул соединений, лимиты по хостам, ретраи, таймауты
+        self.http = http_client or HttpClient()
+        # Локальное хранилище всего собранного (None - не сохраняем)
+        self.trend_store = TrendStore(trend_store_path) if trend_store_path else None
+        # Очередь публикаций: инструмент только ставит пост в очередь, публикует воркер
+        # (None - публикуем сразу внутри хода, как раньше)
+        self.publish_queue = PublishQueue(publish_queue_path) if publish_queue_path else None
+        # Ключевые слова: TF-IDF против скользящего корпуса (прогреваем из хранилища)
+        self.keyword_engine = KeywordEngine()
+        if self.trend_store is not None:
+            self.keyword_engine.observe(
+                f"{item['title']}. {item['summary']}"
+                for item in self.trend_store.query("7d", limit=self.keyword_engine.corpus_size)
+            )
+        # Скорость трендов: счетчики терминов по 6-часовым корзинам времени публикации
+        # и z-score против базы за неделю (прогреваем из хранилища, как ключевые слова)
+        self.trend_velocity = TrendVelocity(self.keyword_engine.terms, bucket_seconds=6 * 3600,
+                                            window_buckets=28)
+        if self.trend_store is not None:
+            self.trend_velocity.observe_timed(self.trend_store.documents("7d"))
         
         # RSS фиды по индустриям (бесплатно!)
         self.rss_feeds = {
@@ -52,6 +124,71 @@ class LinkedInAgent:
             ]
         }
         
+        # Параллельная загрузка RSS: число потоков, таймаут фида и общий дедлайн (сек)
+        self.rss_max_workers = 8
+        self.rss_feed_timeout = 8
+        self.rss_deadline = 15
+        # Кэш фидов с условными запросами (ETag/Last-Modified), переживает рестарт
+        self.feed_cache = FeedCache(feed_cache_path, ttl_seconds=feed_cache_ttl)
+        
+        # Базовые адреса API (переопределяются для локальных стендов)
+        self.hn_api_url = "https://hacker-news.firebaseio.com/v0"
+        self.reddit_url = "https://www.reddit.com"
+        self.linkedin_api_url = "https://api.linkedin.com/v2"
+        
+        # Hacker News: параллельная загрузка историй и кэш по story id
+        self.hn_max_workers = 8
+        self.hn_score_ttl = 300
+        self.hn_item_cache = TTLCache(max_size=2000, ttl_seconds=24 * 3600)
+        
+        # Общий дедлайн get_product_trends (сек)
+        self.trends_deadline = 20
+        # Снимок трендов от фонового обновления и его допустимый возраст (сек)
+        self.trend_snapshot = TrendSnapshot()
+        self.snapshot_max_age = 900
+        # Одновременные запросы одного источника (инструмент + фоновое обновление)
+        # выполняются один раз, остальные ждут общий результат
+        self.source_flights = SingleFlight()
+        
+        # Таймауты инструментов (сек): независимые вызовы одного хода идут параллельно
+        self.default_tool_timeout = 30
+        self.tool_timeouts = {
+            "get_product_trends": self.trends_deadline + 10,
+            "parse_rss_feeds": self.rss_deadline + 5,
+            "create_linkedin_post": 60,
+        }
+        
+        # Мемоизация результатов инструментов: TTL по инструменту (сек).
+        # Инструменты без TTL и с побочными эффектами не кэшируются никогда.
+        self.tool_cache_ttls = {
+            "get_product_trends": 300,
+            "parse_rss_feeds": 300,
+            "get_hackernews_trends": 120,
+            "get_reddit_trends": 300,
+            "analyze_trending_keywords": 600,
+            "validate_topic_relevance": 3600,
+        }
+        self.uncacheable_tools = {"create_linkedin_post"}
+        self.tool_cache = TTLCache(max_size=256, ttl_seconds=300)
+        self.tool_cache_counters: Dict[str, Dict[str, int]] = {}
+        self._tool_cache_lock = threading.Lock()
+        self.tool_flights = SingleFlight()
+        # Инструменты achat - в своем пуле: общий executor event loop (min(32, cpu+4) потоков)
+        # делят префетчер, SQLite очереди публикаций и сохранение кэшей
+        self.tool_executor = ThreadPoolExecutor(max_workers=tool_workers, thread_name_prefix="agent-tool")
+        
+        # Компактное кодирование результатов инструментов: потолок токенов по инструменту
+        self.default_tool_token_ceiling = 1500
+        self.tool_token_ceilings = {
+            "get_product_trends": 2500,
+            "parse_rss_feeds": 1200,
+            "get_hackernews_trends": 800,
+            "get_reddit_trends": 800,
+        }
+        # У web_search_trends message - это инструкция для модели, а не служебный текст
+        self.tool_keep_keys = {"web_search_trends": ("message",)}
+        self.encoding_stats = {"bytes_before": 0, "bytes_after": 0, "tokens_before": 0, "tokens_after": 0}
+        
         # Релевантные subreddits для продакт менеджеров
         self.product_subreddits = [
             "ProductManagement",
@@ -65,7 +202,7 @@ class LinkedInAgent:
         self.tools = [
             {
                 "name": "create_linkedin_post",
-                "description": "Создает и публикует пост в LinkedIn",
+                "description": "Создает и публикует пост в LinkedIn. Пост ставится в очередь публикации и возвращается queue_id; publish_at - отложенная публикация.",
                 "input_schema": {
                     "type": "object",
                     "properties": {
@@ -74,6 +211,10 @@ class LinkedInAgent:
                             "type": "string",
                             "enum": ["PUBLIC", "CONNECTIONS"],
                             "default": "PUBLIC"
+                        },
+                        "publish_at": {
+                            "type": "string",
+                            "description": "Время публикации в ISO 8601, например 2025-01-20T09:00:00+03:00 (не указывай для публикации сразу)"
                         }
                     },
                     "required": ["content"]
@@ -81,10 +222,35 @@ class LinkedInAgent:
             },
             {
                 "name": "get_product_trends",
-                "description": "ЛУЧШИЙ ВЫБОР для продакт аудитории! Получает агрегированные тренды из всех product-специфичных источников: Mind the Product, r/ProductManagement, r/SaaS, r/startups, Hacker News. Используй это первым делом!",
+                "description": "ЛУЧШИЙ ВЫБОР для продакт аудитории! Получает агрегированные тренды из всех product-специфичных источников: Mind the Product, r/ProductManagement, r/SaaS, r/startups, Hacker News. Используй это первым делом! С window=24h/7d возвращает накопленные данные за период без повторной загрузки.",
                 "input_schema": {
                     "type": "object",
-                    "properties": {}
+                    "properties": {
+                        "window": {
+                            "type": "string",
+                            "enum": ["24h", "7d"],
+                            "description": "Период из локального хранилища (не указывай для свежих данных)"
+                        }
+                    }
+                }
+            },
+            {
+                "name": "get_rising_trends",
+                "description": (
+                    "Темы, которые набирают обороты прямо сейчас: ускорение упоминаний в материалах "
+                    f"за последние {self.trend_velocity.bucket_seconds // 3600} ч относительно обычного уровня "
+                    f"за последние {self.trend_velocity.bucket_seconds * self.trend_velocity.window_buckets // 86400} дн. "
+                    "(z-score). Используй вместе с get_product_trends, чтобы отличить новый тренд от вечнозеленой темы."
+                ),
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "limit": {
+                            "type": "integer",
+                            "description": "Количество тем",
+                            "default": 10
+                        }
+                    }
                 }
             },
             {
@@ -197,35 +363,83 @@ class LinkedInAgent:
             "message": f"Используй встроенный web_search для запроса: {query}"
         }
     
+    def _fetch_feed(self, feed_url: str) -> List[Dict[str, Any]]:
+        """
+        Загружает и парсит один RSS фид с таймаутом.
+        Свежий кэш отдается без сети, иначе - условный GET (304 = без парсинга)
+        """
+        cached = self.feed_cache.get(feed_url)
+        if self.feed_cache.is_fresh(cached):
+            self.feed_cache.record_fresh_hit()
+            return cached["articles"]
+        
+        headers = self.feed_cache.conditional_headers(cached)
+        # Без повторов: rss_feed_timeout - бюджет на весь фид, упавший фид уходит в failed_feeds
+        response = self.http.get(feed_url, headers=headers, timeout=self.rss_feed_timeout, max_retries=0)
+        if response.status_code == 304 and cached:
+            self.feed_cache.touch(feed_url)
+            return cached["articles"]
+        response.raise_for_status()
+        feed = feedparser.parse(response.content)
+
+        articles = []
+        # СОКРАТИЛИ: берем только 2 статьи из каждого фида вместо 5
+        for entry in feed.entries[:2]:
+            published = entry.get('published_parsed', None) or entry.get('updated_parsed', None)
+            if published:
+                pub_date = datetime(*published[:6])
+            else:
+                pub_date = datetime.now()
+            
+            articles.append({
+                "title": entry.get('title', ''),
+                "link": entry.get('link', ''),
+                "summary": entry.get('summary', '')[:100],  # СОКРАТИЛИ: 100 символов вместо 200
+                "published": pub_date.strftime("%Y-%m-%d"),
+                # Точное время (unix, UTC) для хранилища и скорости трендов; *_parsed - UTC struct_time
+                "published_at": calendar.timegm(published) if published else None,
+                "source": feed.feed.get('title', 'Unknown')
+            })
+        
+        self.feed_cache.store(
+            feed_url, articles,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")
+        )
+        return articles
+
     def parse_rss_feeds(self, industry: str, limit: int = 10) -> Dict[str, Any]:
         """
         Парсит RSS фиды - ПОЛНОСТЬЮ БЕСПЛАТНО
+        Фиды грузятся параллельно: таймаут на каждый фид и общий дедлайн на всю пачку.
+        Возвращаем то, что успело прийти, и список фидов с ошибкой/таймаутом.
         """
         feeds = self.rss_feeds.get(industry.lower(), self.rss_feeds.get("технологии", []))
+        feeds = list(dict.fromkeys(feeds))
         
         all_articles = []
+        failed_feeds = []
         
-        for feed_url in feeds:
-            try:
-                feed = feedparser.parse(feed_url)
-                # СОКРАТИЛИ: берем только 2 статьи из каждого фида вместо 5
-                for entry in feed.entries[:2]:
-                    published = entry.get('published_parsed', None)
-                    if published:
-                        pub_date = datetime(*published[:6])
-                    else:
-                        pub_date = datetime.now()
-                    
-                    all_articles.append({
-                        "title": entry.get('title', ''),
-                        "link": entry.get('link', ''),
-                        "summary": entry.get('summary', '')[:100],  # СОКРАТИЛИ: 100 символов вместо 200
-                        "published": pub_date.strftime("%Y-%m-%d"),
-                        "source": feed.feed.get('title', 'Unknown')
-                    })
-            except Exception as e:
-                print(f"Ошибка парсинга {feed_url}: {e}")
-                continue
+        if feeds:
+            executor = ThreadPoolExecutor(max_workers=min(self.rss_max_workers, len(feeds)))
+            futures = {executor.submit(self._fetch_feed, url): url for url in feeds}
+            done, not_done = wait(futures, timeout=self.rss_deadline)
+            # Не ждем зависшие фиды - дедлайн важнее полноты
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+            for future in done:
+                try:
+                    all_articles.extend(future.result())
+                except Exception as e:
+                    print(f"Ошибка парсинга {futures[future]}: {e}")
+                    failed_feeds.append({"url": futures[future], "error": str(e)})
+            
+            for future in not_done:
+                failed_feeds.append({"url": futures[future], "error": "timeout"})
+            
+            self.feed_cache.save()
+        
+        self._ingest("article", "rss", all_articles)
         
         all_articles.sort(key=lambda x: x['published'], reverse=True)
         
@@ -233,31 +447,61 @@ class LinkedInAgent:
             "success": True,
             "industry": industry,
             "articles": all_articles[:limit],
-            "total": len(all_articles)
+            "total": len(all_articles),
+            "failed_feeds": failed_feeds
         }
     
+    def _fetch_hn_item(self, story_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает story из кэша или загружает ее.
+        title/url неизменны и живут в кэше долго, score/comments
+        обновляются, если запись старше hn_score_ttl.
+        """
+        cached, age = self.hn_item_cache.get_with_age(story_id)
+        if cached is not MISSING and age < self.hn_score_ttl:
+            return cached
+        
+        story_url = f"{self.hn_api_url}/item/{story_id}.json"
+        try:
+            # Без повторов: при ошибке отдаем историю из кэша
+            story_response = self.http.get(story_url, timeout=5, max_retries=0)
+            story_response.raise_for_status()
+            story = story_response.json() or {}
+        except (requests.exceptions.RequestException, ValueError):
+            # Сеть подвела - устаревший score лучше, чем пропавшая история
+            return None if cached is MISSING else cached
+        
+        item = {
+            "title": story.get('title', ''),
+            "url": story.get('url', ''),
+            "score": story.get('score', 0),
+            "comments": story.get('descendants', 0),
+            "published_at": story.get('time')
+        }
+        self.hn_item_cache.set(story_id, item)
+        return item
+
     def get_hackernews_trends(self, limit: int = 10) -> Dict[str, Any]:
         """
         Получает топовые темы с Hacker News - БЕСПЛАТНО
+        Истории грузятся параллельно, сеть нужна только для новых/устаревших id
         """
         try:
-            top_stories_url = "https://hacker-news.firebaseio.com/v0/topstories.json"
-            response = requests.get(top_stories_url, timeout=10)
+            top_stories_url = f"{self.hn_api_url}/topstories.json"
+            response = self.http.get(top_stories_url)
             response.raise_for_status()
             story_ids = response.json()[:limit]
             
             stories = []
-            for story_id in story_ids:
-                story_url = f"https://hacker-news.firebaseio.com/v0/item/{story_id}.json"
-                story_response = requests.get(story_url, timeout=5)
-                if story_response.ok:
-                    story = story_response.json()
-                    stories.append({
-                        "title": story.get('title', ''),
-                        "url": story.get('url', ''),
-                        "score": story.get('score', 0),
-                        "comments": story.get('descendants', 0)
-                    })
+            if story_ids:
+                workers = min(self.hn_max_workers, len(story_ids))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    # map сохраняет порядок topstories
+                    for item in executor.map(self._fetch_hn_item, story_ids):
+                        if item:
+                            stories.append(dict(item))
+            
+            self._ingest("story", "Hacker News", stories)
             
             return {
                 "success": True,
@@ -277,31 +521,35 @@ class LinkedInAgent:
         Получает популярные посты с Reddit - БЕСПЛАТНО
         """
         try:
-            url = f"https://www.reddit.com/r/{subreddit}/top.json"
+            url = f"{self.reddit_url}/r/{subreddit}/top.json"
             params = {
                 "t": time_filter,
                 "limit": limit
             }
-            headers = {
-                "User-Agent": "LinkedInAgent/1.0"
-            }
             
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = self.http.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             
             posts = []
             for post in data['data']['children']:
                 post_data = post['data']
-                posts.append({
+                item = {
                     "title": post_data.get('title', ''),
                     "score": post_data.get('score', 0),
                     "comments": post_data.get('num_comments', 0),
                     "url": f"https://reddit.com{post_data.get('permalink', '')}",
                     "created": datetime.fromtimestamp(
                         post_data.get('created_utc', 0)
-                    ).strftime("%Y-%m-%d")
-                })
+                    ).strftime("%Y-%m-%d"),
+                    "published_at": post_data.get('created_utc')
+                }
+                # Для link-постов сохраняем целевую ссылку - по ней ищем дубликаты
+                if post_data.get('url_overridden_by_dest'):
+                    item["target_url"] = post_data['url_overridden_by_dest']
+                posts.append(item)
+            
+            self._ingest("post", f"r/{subreddit}", posts)
             
             return {
                 "success": True,
@@ -315,36 +563,203 @@ class LinkedInAgent:
                 "error": str(e)
             }
     
-    def get_product_trends(self) -> Dict[str, Any]:
+    def _product_trend_sources(self) -> Dict[str, Any]:
+        """
+        Источники для get_product_trends: имя -> функция без аргументов
+        """
+        sources = {
+            # Product RSS фиды - СОКРАТИЛИ: было 10
+            "rss": lambda: self.parse_rss_feeds("product_management", limit=5),
+            # Hacker News - СОКРАТИЛИ: было 10
+            "hn": lambda: self.get_hackernews_trends(5),
+        }
+        # Product subreddits - СОКРАТИЛИ: было [:3] по 5 постов
+        for subreddit in self.product_subreddits[:2]:
+            sources[f"reddit:{subreddit}"] = (
+                lambda subreddit=subreddit: self.get_reddit_trends(subreddit, "week", 3)
+            )
+        return sources
+
+    @staticmethod
+    def _run_source(fetch) -> Dict[str, Any]:
+        """
+        Выполняет источник и замеряет время
+        """
+        started = time.monotonic()
+        result = fetch()
+        return {"result": result, "seconds": round(time.monotonic() - started, 2)}
+
+    def _fetch_source(self, name: str, fetch) -> Dict[str, Any]:
+        """
+        _run_source с объединением одновременных запросов одного источника
+        """
+        return self.source_flights.do(name, lambda: self._run_source(fetch))
+
+    def _ingest(self, kind: str, source: str, items: List[Dict[str, Any]]) -> None:
+        """
+        Сохраняет собранное в хранилище и учитывает в скорости трендов
+        (ошибка хранилища не ломает инструмент)
+        """
+        if not items:
+            return
+        self.trend_velocity.observe_timed(
+            (f"{item.get('title', '')}. {item.get('summary', '')}", item.get("published_at"))
+            for item in items
+        )
+        if self.trend_store is None:
+            return
+        try:
+            self.trend_store.ingest(kind, source, items)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения {source} в хранилище: {e}")
+
+    def _resolve_permalink(self, url: str) -> Optional[str]:
+        """
+        Пермалинк HN истории -> ее целевая ссылка (из кэша историй)
+        """
+        story_id = hn_item_id(url)
+        if story_id is None:
+            return None
+        item = self.hn_item_cache.get(story_id)
+        return item.get("url") if item else None
+
+    @staticmethod
+    def _source_label(group: str, item: Dict[str, Any]) -> str:
+        if group == "reddit_discussions":
+            return f"r/{item.get('subreddit', '')}"
+        if group == "hn_stories":
+            return "Hacker News"
+        return item.get("source", "RSS")
+
+    def _merge_duplicates(self, all_trends: Dict[str, List[Dict[str, Any]]]):
+        """
+        Схлопывает одну и ту же историю из разных источников
+        """
+        return deduplicate(all_trends, self._source_label, self._resolve_permalink)
+
+    def _stored_product_trends(self, window: str) -> Dict[str, Any]:
+        """
+        Тренды за окно из локального хранилища, без обращения к сети
+        """
+        all_trends = {
+            "rss_articles": self.trend_store.query(window, kind="article", limit=10),
+            "reddit_discussions": self.trend_store.query(window, kind="post", limit=10),
+            "hn_stories": self.trend_store.query(window, kind="story", limit=10)
+        }
+        for post in all_trends["reddit_discussions"]:
+            post["subreddit"] = post["source"][2:]
+        all_trends, duplicates = self._merge_duplicates(all_trends)
+        
+        return {
+            "success": True,
+            "window": window,
+            "duplicates_removed": duplicates,
+            "sources": {
+                "rss_count": len(all_trends["rss_articles"]),
+                "reddit_count": len(all_trends["reddit_discussions"]),
+                "hn_count": len(all_trends["hn_stories"])
+            },
+            "data": all_trends,
+            "trending_keywords": self._extract_keywords(all_trends),
+            "summary": f"Данные из локального хранилища за {window}"
+        }
+
+    def get_product_trends(self, window: Optional[str] = None) -> Dict[str, Any]:
         """
         Специализированный метод для получения трендов для продакт аудитории
+        С window ("24h"/"7d") читает накопленные данные из хранилища,
+        без хранилища такой запрос возвращает ошибку, а не свежие данные.
+        Источники берутся из снимка фонового обновления, если он не старше
+        snapshot_max_age, остальные опрашиваются параллельно под общим дедлайном.
+        При таймауте части источников возвращаем то, что успели собрать.
         """
+        if window:
+            if window not in WINDOWS:
+                return {"success": False, "error": f"Unknown window: {window}"}
+            if self.trend_store is None:
+                return {
+                    "success": False,
+                    "error": f"Historical window {window} is unavailable: trend store is disabled",
+                    "note": "Вызови без window, чтобы получить свежие данные"
+                }
+            return self._stored_product_trends(window)
+        
         all_trends = {
             "rss_articles": [],
             "reddit_discussions": [],
             "hn_stories": []
         }
+        source_status = {}
         
-        # 1. Product RSS фиды - СОКРАТИЛИ
-        rss_result = self.parse_rss_feeds("product_management", limit=5)  # было 10
-        if rss_result.get("success"):
-            all_trends["rss_articles"] = rss_result.get("articles", [])
+        runs = {}
+        live_sources = {}
+        # Сначала берем теплый снимок фонового обновления, в сеть идем только за устаревшим
+        sources = self._product_trend_sources()
+        for name, fetch in sources.items():
+            entry = self.trend_snapshot.get(name, max_age=self.snapshot_max_age)
+            if entry is not None:
+                runs[name] = entry
+                source_status[name] = {
+                    "status": "snapshot",
+                    "age_seconds": round(time.time() - entry["updated_at"], 1)
+                }
+            else:
+                live_sources[name] = fetch
         
-        # 2. Product subreddits - СОКРАТИЛИ
-        for subreddit in self.product_subreddits[:2]:  # было [:3]
-            reddit_result = self.get_reddit_trends(subreddit, "week", 3)  # было 5
-            if reddit_result.get("success"):
-                for post in reddit_result.get("posts", []):
-                    post["subreddit"] = subreddit
-                    all_trends["reddit_discussions"].append(post)
+        if live_sources:
+            started = time.monotonic()
+            executor = ThreadPoolExecutor(max_workers=len(live_sources))
+            futures = {
+                executor.submit(self._fetch_source, name, fetch): name
+                for name, fetch in live_sources.items()
+            }
+            done, not_done = wait(futures, timeout=self.trends_deadline)
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+            for future in not_done:
+                source_status[futures[future]] = {
+                    "status": "timeout",
+                    "seconds": round(time.monotonic() - started, 2)
+                }
+            
+            for future in done:
+                name = futures[future]
+                try:
+                    run = future.result()
+                except Exception as e:
+                    source_status[name] = {"status": "error", "error": str(e)}
+                    continue
+                
+                result = run["result"]
+                if result.get("success"):
+                    source_status[name] = {"status": "ok", "seconds": run["seconds"]}
+                    self.trend_snapshot.update(name, result, run["seconds"])
+                    runs[name] = run
+                else:
+                    source_status[name] = {
+                        "status": "error",
+                        "seconds": run["seconds"],
+                        "error": result.get("error", "")
+                    }
+        
+        # Порядок источников фиксированный, независимо от того, кто ответил первым
+        for name in sources:
+            if name not in runs:
+                continue
+            result = runs[name]["result"]
+            if name == "rss":
+                all_trends["rss_articles"] = result.get("articles", [])
+            elif name == "hn":
+                all_trends["hn_stories"] = result.get("stories", [])
+            else:
+                subreddit = name.split(":", 1)[1]
+                for post in result.get("posts", []):
+                    all_trends["reddit_discussions"].append(dict(post, subreddit=subreddit))
         
-        # 3. Hacker News - СОКРАТИЛИ
-        hn_result = self.get_hackernews_trends(5)  # было 10
-        if hn_result.get("success"):
-            all_trends["hn_stories"] = hn_result.get("stories", [])
+        all_trends, duplicates = self._merge_duplicates(all_trends)
         
-        # Анализируем ключевые слова
-        keywords_result = self.analyze_trending_keywords(json.dumps(all_trends))
+        # Анализируем ключевые слова прямо по собранным данным, без JSON туда-обратно
+        top_keywords = self._extract_keywords(all_trends)
         
         return {
             "success": True,
@@ -353,11 +768,38 @@ class LinkedInAgent:
                 "reddit_count": len(all_trends["reddit_discussions"]),
                 "hn_count": len(all_trends["hn_stories"])
             },
+            "source_status": source_status,
+            "duplicates_removed": duplicates,
             "data": all_trends,
-            "trending_keywords": keywords_result.get("top_keywords", []),
+            "trending_keywords": top_keywords,
             "summary": "Данные собраны из product-специфичных источников"
         }
     
+    def _extract_keywords(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Топ ключевых слов и фраз по заголовкам и описаниям из всех источников
+        """
+        documents = []
+        for source in data.values():
+            if isinstance(source, list):
+                for item in source:
+                    if isinstance(item, dict):
+                        documents.append(f"{item.get('title', '')}. {item.get('summary', '')}")
+        
+        return self.keyword_engine.top_keywords(documents, limit=10)
+    
+    def get_rising_trends(self, limit: int = 10) -> Dict[str, Any]:
+        """
+        Растущие темы по скорости упоминаний (без обращения к сети)
+        """
+        rising = self.trend_velocity.rising(limit=limit)
+        return {
+            "success": True,
+            "rising": rising,
+            "total": len(rising),
+            "window": self.trend_velocity.stats()
+        }
+    
     def analyze_trending_keywords(self, sources_data: str) -> Dict[str, Any]:
         """
         Анализирует ключевые слова из разных источников
@@ -365,27 +807,9 @@ class LinkedInAgent:
         try:
             data = json.loads(sources_data)
             
-            all_text = []
-            for source in data.values():
-                if isinstance(source, list):
-                    for item in source:
-                        if isinstance(item, dict):
-                            all_text.append(item.get('title', ''))
-                            all_text.append(item.get('summary', ''))
-            
-            words = []
-            for text in all_text:
-                if text:
-                    words.extend([
-                        w.lower() for w in text.split() 
-                        if len(w) > 4 and w.isalpha()
-                    ])
-            
-            word_freq = Counter(words).most_common(10)
-            
             return {
                 "success": True,
-                "top_keywords": [{"word": w, "count": c} for w, c in word_freq],
+                "top_keywords": self._extract_keywords(data),
                 "total_sources": len(data)
             }
         except Exception as e:
@@ -420,23 +844,72 @@ class LinkedInAgent:
             "recommendation": "✅ Актуально" if is_relevant else "❌ Низкая актуальность"
         }
     
-    def create_linkedin_post(self, content: str, visibility: str = "PUBLIC") -> Dict[str, Any]:
+    def create_linkedin_post(self, content: str, visibility: str = "PUBLIC",
+                             publish_at: Optional[str] = None,
+                             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
-        Публикует пост в LinkedIn
+        Публикует пост в LinkedIn: ставит в очередь публикации (если она настроена)
+        и сразу возвращает queue_id, иначе публикует синхронно
         """
-        user_info_url = "https://api.linkedin.com/v2/userinfo"
+        when = None
+        if publish_at:
+            try:
+                when = datetime.fromisoformat(publish_at.replace("Z", "+00:00")).timestamp()
+            except ValueError:
+                return {
+                    "success": False,
+                    "error": f"Неверный формат publish_at: {publish_at}",
+                    "message": "❌ Укажи время в ISO 8601, например 2025-01-20T09:00:00+03:00"
+                }
+
+        if self.publish_queue is None:
+            if when is not None and when > time.time():
+                return {
+                    "success": False,
+                    "error": "Отложенная публикация недоступна без очереди публикаций",
+                    "message": "❌ Ошибка при публикации"
+                }
+            return self.publish_post(content, visibility)
+
+        job = self.publish_queue.enqueue(content, visibility, publish_at=when,
+                                         idempotency_key=idempotency_key)
+        scheduled = datetime.fromtimestamp(job["publish_at"]).strftime("%Y-%m-%d %H:%M")
+        if job["duplicate"]:
+            message = f"ℹ️ Этот пост уже в очереди (#{job['id']}, статус: {job['status']})"
+        elif when is not None and when > time.time():
+            message = f"🗓 Пост запланирован на {scheduled} (очередь #{job['id']})"
+        else:
+            message = f"📤 Пост поставлен в очередь публикации (#{job['id']})"
+        return {
+            "success": True,
+            "queue_id": job["id"],
+            "status": job["status"],
+            "publish_at": scheduled,
+            "post_id": job["post_id"],
+            "message": message
+        }
+
+    def publish_post(self, content: str, visibility: str = "PUBLIC") -> Dict[str, Any]:
+        """
+        Публикует пост в LinkedIn (синхронно).
+        retryable - повтор безопасен: ошибка до отправки поста или 429;
+        unknown - пост мог быть принят (таймаут чтения или 5xx на POST), повторять нельзя;
+        retry_after - из заголовка ответа
+        """
+        user_info_url = f"{self.linkedin_api_url}/userinfo"
         headers = {
             "Authorization": f"Bearer {self.linkedin_token}",
             "Content-Type": "application/json"
         }
+        posting = False
         
         try:
-            user_response = requests.get(user_info_url, headers=headers)
+            user_response = self.http.get(user_info_url, headers=headers)
             user_response.raise_for_status()
             user_data = user_response.json()
             user_id = user_data.get('sub')
             
-            post_url = "https://api.linkedin.com/v2/ugcPosts"
+            post_url = f"{self.linkedin_api_url}/ugcPosts"
             post_data = {
                 "author": f"urn:li:person:{user_id}",
                 "lifecycleState": "PUBLISHED",
@@ -451,7 +924,8 @@ class LinkedInAgent:
                 }
             }
             
-            response = requests.post(post_url, headers=headers, json=post_data)
+            posting = True
+            response = self.http.post(post_url, headers=headers, json=post_data)
             response.raise_for_status()
             
             return {
@@ -460,19 +934,127 @@ class LinkedInAgent:
                 "message": "✅ Пост успешно опубликован!"
             }
         except requests.exceptions.RequestException as e:
+            response = getattr(e, "response", None)
+            status = response.status_code if response is not None else None
+            retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+            if status is not None:
+                # 429 - запрос не обработан; 5xx на POST - пост мог успеть создаться
+                retryable = status == 429 or (status in RETRY_STATUSES and not posting)
+                unknown = posting and status in RETRY_STATUSES and status != 429
+            else:
+                # Без ответа сервера безопасна только ошибка соединения: запрос не ушел
+                sent = posting and not self._connect_failed(e)
+                retryable = not sent and isinstance(
+                    e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+                )
+                unknown = sent
             return {
                 "success": False,
                 "error": str(e),
+                "retryable": retryable,
+                "unknown": unknown,
+                "retry_after": float(retry_after) if retry_after.isdigit() else None,
                 "message": "❌ Ошибка при публикации"
             }
+
+    @staticmethod
+    def _connect_failed(error: requests.exceptions.RequestException) -> bool:
+        """
+        Ошибка на этапе соединения (DNS, отказ, таймаут подключения) - запрос точно не отправлен
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.exceptions.ConnectionError):
+            return False
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
     
+    def _tool_cache_key(self, tool_name: str, tool_input: Dict[str, Any]) -> str:
+        """
+        Ключ кэша: имя инструмента + вход с подставленными дефолтами схемы,
+        чтобы {"industry": "x"} и {"industry": "x", "limit": 10} совпадали
+        """
+        schema = next((tool["input_schema"] for tool in self.tools if tool["name"] == tool_name), {})
+        normalized = {
+            name: spec["default"]
+            for name, spec in schema.get("properties", {}).items() if "default" in spec
+        }
+        for name, value in tool_input.items():
+            if value is None:
+                continue
+            normalized[name] = value.strip() if isinstance(value, str) else value
+        return f"{tool_name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
     def process_tool_call(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Обрабатывает вызовы инструментов
+        Обрабатывает вызовы инструментов.
+        Результаты идемпотентных инструментов кэшируются по TTL (общий кэш для всех
+        пользователей), инструменты с побочными эффектами всегда выполняются.
+        """
+        ttl = self.tool_cache_ttls.get(tool_name)
+        if ttl is None or tool_name in self.uncacheable_tools:
+            return self._execute_tool(tool_name, tool_input)
+        
+        key = self._tool_cache_key(tool_name, tool_input)
+        cached = self.tool_cache.get(key)
+        with self._tool_cache_lock:
+            stats = self.tool_cache_counters.setdefault(tool_name, {"hits": 0, "misses": 0})
+            stats["hits" if cached is not None else "misses"] += 1
+        if cached is not None:
+            return cached
+        
+        def execute() -> Dict[str, Any]:
+            result = self._execute_tool(tool_name, tool_input)
+            # Ошибки не кэшируем - следующий вызов попробует снова
+            if result.get("success"):
+                self.tool_cache.set(key, result, ttl_seconds=ttl)
+            return result
+        
+        # Одинаковые вызовы от разных пользователей в один момент выполняются один раз
+        return self.tool_flights.do(key, execute)
+
+    def tool_cache_stats(self) -> Dict[str, Any]:
+        """
+        Счетчики попаданий кэша инструментов: общие и по каждому инструменту
+        """
+        with self._tool_cache_lock:
+            by_tool = {name: dict(counts) for name, counts in self.tool_cache_counters.items()}
+        return {
+            "total": self.tool_cache.stats(),
+            "by_tool": by_tool,
+            "coalesced": self.tool_flights.shared,
+            "sources_coalesced": self.source_flights.shared
+        }
+
+    def metrics_samples(self):
+        """
+        Коллектор для metrics: токены и счетчики кэшей агента на момент выгрузки
+        """
+        stats = self.cache_stats
+        for kind, key in (("input", "input_tokens"), ("output", "output_tokens"),
+                          ("cache_read", "cache_read_tokens"), ("cache_write", "cache_write_tokens")):
+            yield "llm_tokens_total", "counter", {"model": self.model, "type": kind}, stats[key]
+        
+        caches = {
+            "prompt": (stats["hits"], stats["misses"]),
+            "feed": (self.feed_cache.stats["fresh_hits"] + self.feed_cache.stats["not_modified"],
+                     self.feed_cache.stats["fetched"]),
+        }
+        for name, cache in (("tool", self.tool_cache), ("hn_item", self.hn_item_cache)):
+            cache_stats = cache.stats()
+            caches[name] = (cache_stats["hits"], cache_stats["misses"])
+        for name, (hits, misses) in caches.items():
+            yield "cache_hits_total", "counter", {"cache": name}, hits
+            yield "cache_misses_total", "counter", {"cache": name}, misses
+
+    def _execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Вызывает инструмент по имени
         """
         tool_map = {
             "create_linkedin_post": self.create_linkedin_post,
             "get_product_trends": self.get_product_trends,
+            "get_rising_trends": self.get_rising_trends,
             "web_search_trends": self.web_search_trends,
             "parse_rss_feeds": self.parse_rss_feeds,
             "get_hackernews_trends": self.get_hackernews_trends,
@@ -482,19 +1064,15 @@ class LinkedInAgent:
         }
         
         if tool_name in tool_map:
-            return tool_map[tool_name](**tool_input)
+            with metrics.timer("agent_tool_seconds", tool=tool_name):
+                return tool_map[tool_name](**tool_input)
         return {"success": False, "error": f"Unknown tool: {tool_name}"}
     
-    def chat(self, user_message: str) -> str:
+    def _build_system_prompt(self) -> str:
         """
-        Основной метод взаимодействия - ИСПРАВЛЕННАЯ ВЕРСИЯ
+        Собирает системный промпт под текущую индустрию и аудиторию
         """
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
-        
-        system_prompt = f"""Ты - профессиональный LinkedIn Content Manager для ПРОДАКТ АУДИТОРИИ с бесплатным мониторингом трендов.
+        return f"""Ты - профессиональный LinkedIn Content Manager для ПРОДАКТ АУДИТОРИИ с бесплатным мониторингом трендов.
 
 Индустрия: {self.industry}
 🎯 ЦЕЛЕВАЯ АУДИТОРИЯ: {self.target_audience or "Product Managers, Directors of Product, Product Leads"}
@@ -506,7 +1084,8 @@ class LinkedInAgent:
 1. **parse_rss_feeds** с "product_management" - Mind the Product, Product Coalition, Intercom, Lenny's Newsletter
 2. **get_reddit_trends** - r/ProductManagement, r/product_design, r/SaaS, r/startups
 3. **get_hackernews_trends** - tech и product обсуждения
-4. **web_search_trends** - дополнительная верификация
+4. **get_rising_trends** - темы, которые набирают обороты прямо сейчас
+5. **web_search_trends** - дополнительная верификация
 
 🔥 ПРИОРИТЕТНЫЕ ТЕМЫ ДЛЯ PM АУДИТОРИИ:
 - Product strategy & vision
@@ -611,69 +1190,290 @@ Telegram лимит: максимум 4000 символов!
 
 ЗАПОМНИ: Каждое слово должно нести смысл. Убирай всё лишнее. Краткость = ценность для PM."""
 
-        response = self.client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=2048,  # ОГРАНИЧИЛИ: было 4096
-            system=system_prompt,
-            tools=self.tools,
-            messages=self.conversation_history
+    def _cached_prefix(self):
+        """
+        Системный промпт и схемы инструментов с cache_control брейкпоинтами.
+        Собираются один раз на конфигурацию агента (индустрия, аудитория, набор инструментов).
+        """
+        key = (self.industry, self.target_audience, tuple(tool["name"] for tool in self.tools))
+        if self._prefix_cache_key != key:
+            system = [{
+                "type": "text",
+                "text": self._build_system_prompt(),
+                "cache_control": {"type": "ephemeral"}
+            }]
+            tools = [dict(tool) for tool in self.tools]
+            if tools:
+                tools[-1]["cache_control"] = {"type": "ephemeral"}
+            self._prefix_cache = (system, tools)
+            self._prefix_cache_key = key
+        return self._prefix_cache
+
+    def _request_params(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Параметры запроса к Messages API (общие для sync и async версий)
+        """
+        system, tools = self._cached_prefix()
+        return {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "system": system,
+            "tools": tools,
+            "messages": self._prepare_messages(messages)
+        }
+
+    def _record_usage(self, response) -> None:
+        """
+        Учет попаданий в prompt cache по response.usage
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        cache_read = usage.cache_read_input_tokens or 0
+        cache_write = usage.cache_creation_input_tokens or 0
+
+        stats = self.cache_stats
+        stats["requests"] += 1
+        stats["hits" if cache_read else "misses"] += 1
+        stats["cache_read_tokens"] += cache_read
+        stats["cache_write_tokens"] += cache_write
+        stats["input_tokens"] += usage.input_tokens or 0
+        stats["output_tokens"] += usage.output_tokens or 0
+
+    def _create_message(self, messages: List[Dict[str, Any]]):
+        """
+        Синхронный запрос к Claude
+        """
+        params = self._request_params(messages)
+        with metrics.timer("llm_request_seconds", model=self.model, mode="sync"):
+            response = self.client.messages.create(**params)
+        self._record_usage(response)
+        return response
+
+    async def _acreate_message(self, messages: List[Dict[str, Any]],
+                               on_text: Optional[Callable[[str], Awaitable[None]]] = None):
+        """
+        Асинхронный запрос к Claude.
+        С on_text ответ стримится: колбэк получает накопленный текст хода.
+        """
+        params = self._request_params(messages)
+        with metrics.timer("llm_request_seconds", model=self.model,
+                           mode="async" if on_text is None else "stream"):
+            if on_text is None:
+                response = await self.async_client.messages.create(**params)
+            else:
+                async with self.async_client.messages.stream(**params) as stream:
+                    text = ""
+                    async for delta in stream.text_stream:
+                        text += delta
+                        await on_text(text)
+                    response = await stream.get_final_message()
+        self._record_usage(response)
+        return response
+
+    def _prepare_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Сжимает историю под бюджет токенов перед отправкой в Claude
+        """
+        compacted, saved = self.history_compactor.compact(messages)
+        self.compaction_stats["calls"] += 1
+        if saved:
+            self.compaction_stats["compacted_calls"] += 1
+            self.compaction_stats["tokens_saved"] += saved
+            logger.info(f"История сжата: сэкономлено ~{saved} токенов "
+                        f"({len(messages)} -> {len(compacted)} сообщений)")
+        return compacted
+
+    def _store_turn(self, history: List[Dict[str, Any]], turn: List[Dict[str, Any]]) -> None:
+        """
+        Дописывает завершенный ход в историю и сжимает ее, чтобы память не росла
+        """
+        history.extend(turn)
+        history[:], _ = self.history_compactor.compact(history)
+
+    def _tool_result_block(self, block, tool_result: Dict[str, Any],
+                           is_error: bool = False) -> Dict[str, Any]:
+        """
+        Превращает результат инструмента в tool_result блок для Claude
+        """
+        print(f"✅ {json.dumps(tool_result, ensure_ascii=False, indent=2)[:200]}...")
+        if tool_result.get("success") is False:
+            metrics.inc("agent_tool_errors_total", tool=block.name)
+        content, stats = compact_tool_result(
+            tool_result,
+            token_ceiling=self.tool_token_ceilings.get(block.name, self.default_tool_token_ceiling),
+            keep_keys=self.tool_keep_keys.get(block.name, ())
+        )
+        for key in ("bytes_before", "bytes_after", "tokens_before", "tokens_after"):
+            self.encoding_stats[key] += stats[key]
+        logger.info(
+            f"{block.name}: {stats['bytes_before']}B/~{stats['tokens_before']}t -> "
+            f"{stats['bytes_after']}B/~{stats['tokens_after']}t"
+            + (f", отброшено {stats['truncated']}" if stats["truncated"] else "")
         )
+        result_block = {
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": content
+        }
+        if is_error:
+            result_block["is_error"] = True
+        return result_block
+
+    def _tool_timeout(self, tool_name: str) -> float:
+        return self.tool_timeouts.get(tool_name, self.default_tool_timeout)
+
+    def _tool_error_block(self, block, error: str) -> Dict[str, Any]:
+        """
+        Упавший или зависший инструмент возвращается модели как ошибка, а не исключение
+        """
+        logger.warning(f"Инструмент {block.name} завершился с ошибкой: {error}")
+        return self._tool_result_block(block, {"success": False, "error": error}, is_error=True)
+
+    def _run_tools(self, blocks) -> List[Dict[str, Any]]:
+        """
+        Выполняет все tool_use блоки хода параллельно в потоках.
+        Порядок результатов и пары tool_use_id сохраняются.
+        """
+        if not blocks:
+            return []
+        for block in blocks:
+            self._log_tool_use(block)
+        
+        executor = ThreadPoolExecutor(max_workers=len(blocks))
+        futures = [executor.submit(self.process_tool_call, block.name, block.input) for block in blocks]
+        started = time.monotonic()
+        
+        tool_results = []
+        for block, future in zip(blocks, futures):
+            remaining = self._tool_timeout(block.name) - (time.monotonic() - started)
+            try:
+                tool_result = future.result(timeout=max(remaining, 0))
+            except FuturesTimeoutError:
+                tool_results.append(self._tool_error_block(block, f"timeout ({self._tool_timeout(block.name)}s)"))
+                continue
+            except Exception as e:
+                tool_results.append(self._tool_error_block(block, str(e)))
+                continue
+            tool_results.append(self._tool_result_block(block, tool_result))
+        
+        # Зависшие инструменты не держат ход
+        executor.shutdown(wait=False, cancel_futures=True)
+        return tool_results
+
+    async def _arun_tool(self, block) -> Dict[str, Any]:
+        """
+        Инструмент в пуле tool_executor. Таймаут отсчитывается с начала выполнения,
+        а не с постановки в очередь пула: под нагрузкой ожидание потока не съедает его
+        """
+        timeout = self._tool_timeout(block.name)
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+
+        def run():
+            loop.call_soon_threadsafe(started.set)
+            return self.process_tool_call(block.name, block.input)
+
+        future = loop.run_in_executor(self.tool_executor, run)
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            await asyncio.wait({future, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            tool_result = await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return self._tool_error_block(block, f"timeout ({timeout}s)")
+        except Exception as e:
+            return self._tool_error_block(block, str(e))
+        finally:
+            waiter.cancel()
+        return self._tool_result_block(block, tool_result)
+
+    async def _arun_tools(self, blocks) -> List[Dict[str, Any]]:
+        """
+        Асинхронный вариант _run_tools: gather сохраняет порядок блоков
+        """
+        for block in blocks:
+            self._log_tool_use(block)
+        return list(await asyncio.gather(*(self._arun_tool(block) for block in blocks)))
+
+    @staticmethod
+    def _log_tool_use(block) -> None:
+        """
+        Печатает вызов инструмента
+        """
+        print(f"\n🔧 {block.name}")
+        print(f"📝 {json.dumps(block.input, ensure_ascii=False, indent=2)}")
+
+    @staticmethod
+    def _extract_text(content) -> str:
+        """
+        Извлекает финальный текст из блоков ответа
+        """
+        return "".join(block.text for block in content if hasattr(block, "text"))
+
+    def chat(self, user_message: str, history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Основной метод взаимодействия - ИСПРАВЛЕННАЯ ВЕРСИЯ
+        history - история конкретной сессии (по умолчанию общая self.conversation_history)
+        """
+        if history is None:
+            history = self.conversation_history
+        # Сообщения текущего хода копим отдельно и дописываем в историю в конце,
+        # чтобы параллельный ход не вклинился между tool_use и tool_result
+        turn = [{"role": "user", "content": user_message}]
+        response = self._create_message(history + turn)
+        iterations = 1
         
         # ИСПРАВЛЕННАЯ ЛОГИКА: обрабатываем ВСЕ tool_use блоки за раз
         while response.stop_reason == "tool_use":
-            # Собираем ВСЕ tool_use блоки из этого ответа
-            tool_results = []
+            # Собираем ВСЕ tool_use блоки из этого ответа и выполняем параллельно
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            tool_results = self._run_tools(tool_uses)
             
-            for block in response.content:
-                if block.type == "tool_use":
-                    tool_name = block.name
-                    tool_input = block.input
-                    
-                    print(f"\n🔧 {tool_name}")
-                    print(f"📝 {json.dumps(tool_input, ensure_ascii=False, indent=2)}")
-                    
-                    # Выполняем функцию
-                    tool_result = self.process_tool_call(tool_name, tool_input)
-                    
-                    print(f"✅ {json.dumps(tool_result, ensure_ascii=False, indent=2)[:200]}...")
-                    
-                    # Добавляем результат в список
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": json.dumps(tool_result, ensure_ascii=False)
-                    })
-            
-            # Добавляем ответ Claude с tool_use блоками
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": response.content
-            })
-            
-            # Добавляем ВСЕ tool_result блоки ОДНИМ сообщением
-            self.conversation_history.append({
-                "role": "user",
-                "content": tool_results
-            })
+            # Ответ Claude с tool_use блоками и ВСЕ tool_result блоки ОДНИМ сообщением
+            turn.append({"role": "assistant", "content": content_to_blocks(response.content)})
+            turn.append({"role": "user", "content": tool_results})
             
             # Продолжаем диалог
-            response = self.client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=2048,  # ОГРАНИЧИЛИ: было 4096
-                system=system_prompt,
-                tools=self.tools,
-                messages=self.conversation_history
-            )
+            response = self._create_message(history + turn)
+            iterations += 1
         
-        # Извлекаем финальный ответ
-        final_response = ""
-        for block in response.content:
-            if hasattr(block, "text"):
-                final_response += block.text
+        metrics.observe("agent_turn_iterations", iterations)
+        turn.append({"role": "assistant", "content": content_to_blocks(response.content)})
+        self._store_turn(history, turn)
         
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": response.content
-        })
-        
-        return final_response
+        return self._extract_text(response.content)
+
+    async def achat(self, user_message: str,
+                    history: Optional[List[Dict[str, Any]]] = None,
+                    on_text: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Асинхронная версия chat() для Telegram хендлеров.
+        Запросы к Claude идут через AsyncAnthropic, а блокирующие инструменты
+        (requests/feedparser) выполняются в пуле потоков - event loop бота свободен.
+        on_text - колбэк стриминга: получает накопленный текст текущего хода,
+        а пустую строку, когда ход закончился вызовом инструментов.
+        """
+        if history is None:
+            history = self.conversation_history
+        turn = [{"role": "user", "content": user_message}]
+        response = await self._acreate_message(history + turn, on_text)
+        iterations = 1
+
+        while response.stop_reason == "tool_use":
+            if on_text is not None:
+                # Текст перед вызовом инструментов - не финальный ответ
+                await on_text("")
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            tool_results = await self._arun_tools(tool_uses)
+
+            turn.append({"role": "assistant", "content": content_to_blocks(response.content)})
+            turn.append({"role": "user", "content": tool_results})
+
+            response = await self._acreate_message(history + turn, on_text)
+            iterations += 1
+
+        metrics.observe("agent_turn_iterations", iterations)
+        turn.append({"role": "assistant", "content": content_to_blocks(response.content)})
+        self._store_turn(history, turn)
+
+        return self._extract_text(response.content)
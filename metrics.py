@@ -0,0 +1,230 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин латентности (сек): от быстрых кэш-попаданий до долгих ходов агента
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# (имя, тип counter/gauge, метки, значение) от коллекторов, считаемых при выгрузке
+Sample = Tuple[str, str, Dict[str, Any], float]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами (как в Prometheus): счетчики, сумма, число
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля линейной интерполяцией внутри корзины
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index >= len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Реестр метрик процесса: гистограммы, счетчики и коллекторы,
+    которые снимают значения с готовых счетчиков (кэши, токены) в момент выгрузки.
+    Потокобезопасен - пишется и из event loop, и из пула потоков инструментов.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None) -> None:
+        """
+        Описание метрики для выгрузки; buckets - свои корзины гистограммы
+        """
+        with self._lock:
+            self._help[name] = help_text
+            if buckets is not None:
+                self._buckets[name] = tuple(buckets)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Замеряет длительность блока (в том числе с await внутри)
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def histogram_summary(self, name: str) -> Dict[LabelKey, Dict[str, float]]:
+        """
+        {метки: {count, avg, p50, p95}} - для /stats
+        """
+        with self._lock:
+            series = dict(self._histograms.get(name, {}))
+            return {
+                key: {
+                    "count": histogram.count,
+                    "avg": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95)
+                }
+                for key, histogram in series.items()
+            }
+
+    def counter_values(self, name: str) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def collect(self) -> List[Sample]:
+        with self._lock:
+            collectors = list(self._collectors)
+        samples: List[Sample] = []
+        for collector in collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                logger.warning(f"Коллектор метрик упал: {e}")
+        return samples
+
+    def render_prometheus(self) -> str:
+        """
+        Текстовый формат экспозиции Prometheus 0.0.4
+        """
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name in sorted(self._histograms):
+                header(name, "histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+            for name in sorted(self._counters):
+                header(name, "counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        grouped: Dict[str, Tuple[str, List[Tuple[LabelKey, float]]]] = {}
+        for name, kind, labels, value in self.collect():
+            grouped.setdefault(name, (kind, []))[1].append((_label_key(labels), value))
+        for name in sorted(grouped):
+            kind, values = grouped[name]
+            header(name, kind)
+            for key, value in sorted(values):
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса (агент, HTTP клиент и бот пишут в него)
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Metrics = metrics
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        # Скрейпы раз в 15 секунд не должны засорять лог бота
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1",
+                      registry: Metrics = metrics) -> ThreadingHTTPServer:
+    """
+    Отдает /metrics в фоновом потоке; остановка - server.shutdown()
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Метрики Prometheus: http://{host}:{server.server_address[1]}/metrics")
+    return server
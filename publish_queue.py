@@ -0,0 +1,361 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL,
+    content TEXT NOT NULL,
+    visibility TEXT NOT NULL,
+    status TEXT NOT NULL,
+    publish_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    post_id TEXT,
+    last_error TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_due ON posts (status, next_attempt_at);
+-- Неопубликованная запись на ключ одна: failed переиспользуется при повторной постановке
+CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_pending_key ON posts (idempotency_key) WHERE status != 'published';
+CREATE INDEX IF NOT EXISTS idx_posts_key ON posts (idempotency_key, updated_at);
+"""
+
+# Ключ занят, пока запись в работе или ждет проверки
+ACTIVE_STATUSES = ("queued", "publishing", "needs_review")
+
+# queued -> publishing -> published | queued (повтор) | failed | needs_review
+# needs_review: исход публикации неизвестен (пост мог выйти), решает человек
+STATUSES = ("queued", "publishing", "published", "failed", "needs_review")
+
+metrics.describe("publish_attempts_total", "Попытки публикации из очереди по результату")
+metrics.describe("publish_seconds", "Длительность одной попытки публикации")
+
+
+def idempotency_key_for(content: str, visibility: str) -> str:
+    """
+    Ключ по умолчанию: один и тот же текст не ставится в очередь дважды,
+    пока он в работе или недавно опубликован (модель может повторить вызов инструмента)
+    """
+    return hashlib.sha256(f"{visibility}\n{content.strip()}".encode("utf-8")).hexdigest()
+
+
+class PublishQueue:
+    """
+    Персистентная очередь публикаций в SQLite.
+    - ключ идемпотентности: повторная постановка возвращает запись в работе или
+      опубликованную за последние duplicate_window секунд; failed запись ставится заново
+    - publish_at: отложенная публикация
+    - захват записи непосредственно перед публикацией с арендой (lease): запись,
+      зависшая в "publishing" дольше lease_seconds (падение процесса посреди
+      публикации), уходит в needs_review - пост мог успеть выйти
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300, duplicate_window: float = 24 * 3600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.duplicate_window = duplicate_window
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        # Колбэки "появилась новая запись" (будят воркер из любого потока)
+        self.listeners: List[Callable[[], None]] = []
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def enqueue(self, content: str, visibility: str = "PUBLIC", publish_at: Optional[float] = None,
+                idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ставит пост в очередь, возвращает запись (+ duplicate=True, если ключ занят)
+        """
+        now = time.time()
+        key = idempotency_key or idempotency_key_for(content, visibility)
+        due = max(publish_at or now, now)
+        with self._lock, self._conn:
+            existing = self._conn.execute(
+                "SELECT * FROM posts WHERE idempotency_key = ? AND (status IN (?, ?, ?) "
+                "OR (status = 'published' AND updated_at >= ?)) ORDER BY id DESC LIMIT 1",
+                (key, *ACTIVE_STATUSES, now - self.duplicate_window)
+            ).fetchone()
+            if existing is not None:
+                return dict(existing, duplicate=True)
+
+            failed = self._conn.execute(
+                "SELECT id FROM posts WHERE idempotency_key = ? AND status = 'failed'", (key,)
+            ).fetchone()
+            if failed is not None:
+                job_id = failed["id"]
+                self._conn.execute(
+                    "UPDATE posts SET content = ?, visibility = ?, status = 'queued', publish_at = ?, "
+                    "next_attempt_at = ?, attempts = 0, claimed_at = NULL, last_error = '', "
+                    "updated_at = ? WHERE id = ?",
+                    (content, visibility, due, due, now, job_id)
+                )
+            else:
+                job_id = self._conn.execute(
+                    "INSERT INTO posts (idempotency_key, content, visibility, status, publish_at, "
+                    "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (key, content, visibility, due, due, now, now)
+                ).lastrowid
+            row = self._conn.execute("SELECT * FROM posts WHERE id = ?", (job_id,)).fetchone()
+
+        for listener in list(self.listeners):
+            listener()
+        return dict(row, duplicate=False)
+
+    def claim(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Атомарно забирает до limit записей, которым пора публиковаться.
+        Забирать стоит только тогда, когда публикация начнется сразу
+        """
+        if limit <= 0:
+            return []
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id FROM posts WHERE status = 'queued' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            ids = [row["id"] for row in rows]
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            self._conn.execute(
+                f"UPDATE posts SET status = 'publishing', claimed_at = ?, attempts = attempts + 1, "
+                f"updated_at = ? WHERE id IN ({placeholders})",
+                (now, now, *ids)
+            )
+            claimed = self._conn.execute(
+                f"SELECT * FROM posts WHERE id IN ({placeholders}) ORDER BY next_attempt_at", ids
+            ).fetchall()
+        return [dict(row) for row in claimed]
+
+    def expire_leases(self, now: Optional[float] = None) -> List[int]:
+        """
+        Записи в "publishing" с истекшей арендой -> needs_review, возвращает их id
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id FROM posts WHERE status = 'publishing' AND claimed_at < ?",
+                (now - self.lease_seconds,)
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE posts SET status = 'needs_review', claimed_at = NULL, updated_at = ?, "
+                "last_error = 'аренда истекла: исход публикации неизвестен' "
+                "WHERE status = 'publishing' AND claimed_at < ?",
+                (now, now - self.lease_seconds)
+            )
+        return [row["id"] for row in rows]
+
+    def _update(self, job_id: int, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE posts SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def mark_published(self, job_id: int, post_id: Optional[str]) -> None:
+        self._update(job_id, status="published", post_id=post_id, last_error="", claimed_at=None)
+
+    def mark_retry(self, job_id: int, error: str, delay: float) -> None:
+        self._update(job_id, status="queued", last_error=error, claimed_at=None,
+                     next_attempt_at=time.time() + delay)
+
+    def mark_failed(self, job_id: int, error: str) -> None:
+        self._update(job_id, status="failed", last_error=error, claimed_at=None)
+
+    def mark_review(self, job_id: int, error: str) -> None:
+        self._update(job_id, status="needs_review", last_error=error, claimed_at=None)
+
+    def requeue(self, job_id: int) -> bool:
+        """
+        Возвращает failed/needs_review запись в очередь (после ручной проверки)
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE posts SET status = 'queued', attempts = 0, next_attempt_at = ?, claimed_at = NULL, "
+                "updated_at = ? WHERE id = ? AND status IN ('failed', 'needs_review')",
+                (now, now, job_id)
+            )
+        if cursor.rowcount:
+            for listener in list(self.listeners):
+                listener()
+        return bool(cursor.rowcount)
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM posts WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def next_due(self) -> Optional[float]:
+        """
+        Ближайшее время, когда в очереди появится работа
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) AS due FROM posts WHERE status = 'queued'"
+            ).fetchone()
+        return row["due"] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS total FROM posts GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({row["status"]: row["total"] for row in rows})
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PublishWorker:
+    """
+    Фоновая публикация из очереди внутри event loop бота:
+    - не больше concurrency одновременных публикаций
+    - не чаще одной публикации в min_interval секунд (лимиты LinkedIn);
+      запись забирается из очереди только когда слот уже получен
+    - повтор с экспоненциальной задержкой и джиттером для retryable ошибок
+      (429, ошибки до отправки поста), Retry-After сервера имеет приоритет
+    - после max_attempts попыток запись помечается failed
+    - неизвестный исход (таймаут чтения, 5xx на POST) не повторяется:
+      запись уходит в needs_review, чтобы не опубликовать пост дважды
+    publish(content, visibility) - синхронная функция, возвращает dict результата
+    """
+
+    def __init__(self, queue: PublishQueue, publish: Callable[[str, str], Dict[str, Any]],
+                 concurrency: int = 2, min_interval: float = 60, max_attempts: int = 5,
+                 base_delay: float = 30, max_delay: float = 3600, poll_interval: float = 30):
+        self.queue = queue
+        self.publish = publish
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next_slot = 0.0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.queue.listeners.append(self.wake)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Очередь публикаций запущена: {self.queue.counts()}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        if self.wake in self.queue.listeners:
+            self.queue.listeners.remove(self.wake)
+        self._task.cancel()
+        # Идущие публикации дожидаемся: прерванная попытка ушла бы в needs_review по lease
+        await asyncio.gather(self._task, *self._inflight, return_exceptions=True)
+        self._task = None
+
+    def wake(self) -> None:
+        """
+        Будит воркер (потокобезопасно: enqueue вызывается из потоков инструментов)
+        """
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def backoff(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        if retry_after:
+            return min(float(retry_after), self.max_delay)
+        delay = min(self.base_delay * (2 ** max(attempts - 1, 0)), self.max_delay)
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _run(self) -> None:
+        while True:
+            # Сбрасываем до работы: пробуждение во время итерации не теряется
+            self._wake.clear()
+            timeout = self.poll_interval
+            try:
+                for job_id in await asyncio.to_thread(self.queue.expire_leases):
+                    logger.error(f"Пост #{job_id}: аренда истекла, нужна ручная проверка")
+                    metrics.inc("publish_attempts_total", result="unknown")
+
+                if len(self._inflight) < self.concurrency:
+                    # Сначала слот частоты, потом захват: запись не ждет в "publishing"
+                    slot_in = self._next_slot - time.monotonic()
+                    if slot_in <= 0:
+                        jobs = await asyncio.to_thread(self.queue.claim, 1)
+                        if jobs:
+                            self._next_slot = time.monotonic() + self.min_interval
+                            self._start(jobs[0])
+                            continue
+                    due = await asyncio.to_thread(self.queue.next_due)
+                    if due is not None:
+                        timeout = min(timeout, max(due - time.time(), slot_in, 0.05))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка очереди публикаций: {e}")
+
+            # Спим до ближайшей записи/слота, новой постановки в очередь или конца публикации
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, job: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self._process(job))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        task.add_done_callback(lambda _: self._wake.set())
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        try:
+            with metrics.timer("publish_seconds"):
+                result = await asyncio.to_thread(self.publish, job["content"], job["visibility"])
+        except Exception as e:
+            # Неизвестно, на каком шаге упала публикация
+            result = {"success": False, "error": str(e), "unknown": True}
+
+        if result.get("success"):
+            await asyncio.to_thread(self.queue.mark_published, job["id"], result.get("post_id"))
+            metrics.inc("publish_attempts_total", result="published")
+            logger.info(f"Пост #{job['id']} опубликован: {result.get('post_id')}")
+            return
+
+        error = result.get("error", "unknown error")
+        if result.get("unknown"):
+            await asyncio.to_thread(self.queue.mark_review, job["id"], error)
+            metrics.inc("publish_attempts_total", result="unknown")
+            logger.error(f"Пост #{job['id']}: исход публикации неизвестен ({error}), нужна ручная проверка")
+        elif result.get("retryable") and job["attempts"] < self.max_attempts:
+            delay = self.backoff(job["attempts"], result.get("retry_after"))
+            await asyncio.to_thread(self.queue.mark_retry, job["id"], error, delay)
+            metrics.inc("publish_attempts_total", result="retry")
+            logger.warning(f"Пост #{job['id']}: попытка {job['attempts']} не удалась ({error}), "
+                           f"повтор через {delay:.0f}с")
+        else:
+            await asyncio.to_thread(self.queue.mark_failed, job["id"], error)
+            metrics.inc("publish_attempts_total", result="failed")
+            logger.error(f"Пост #{job['id']} не опубликован: {error}")
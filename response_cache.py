@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from json_file import load_json, save_json_atomic
+
+
+def response_key(command: str, prompt: str, snapshot_hash: str, config: Dict[str, Any]) -> str:
+    """
+    Ключ ответа: команда + хэш промпта, содержимого снимка трендов и конфигурации агента
+    """
+    payload = json.dumps(
+        {"prompt": prompt, "snapshot": snapshot_hash, "config": config},
+        sort_keys=True, ensure_ascii=False
+    )
+    return f"{command}:{hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()}"
+
+
+class ResponseCache:
+    """
+    Кэш готовых ответов канонических команд бота (/trends, /create).
+    Ответ меняется только вместе с данными трендов, поэтому ключ включает
+    хэш снимка - новые данные дают новый ключ, а TTL ограничивает возраст.
+    При заданном path кэш переживает рестарт процесса (JSON на диске).
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 900, max_entries: int = 100):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+        self._load()
+
+    def _load(self) -> None:
+        self._entries = load_json(self.path, {}, label="кэш ответов")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Запись {"text", "created_at"}, если она есть и не старше ttl_seconds
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["created_at"] >= self.ttl_seconds:
+                del self._entries[key]
+                self._dirty = True
+                entry = None
+            self.stats["hits" if entry is not None else "misses"] += 1
+            return entry
+
+    def set(self, key: str, text: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {"text": text, "created_at": time.time()}
+            self._prune()
+            self._dirty = True
+            self.stats["stored"] += 1
+
+    def _prune(self) -> None:
+        now = time.time()
+        for key in [key for key, entry in self._entries.items()
+                    if now - entry["created_at"] >= self.ttl_seconds]:
+            del self._entries[key]
+        # Словарь хранит порядок вставки - удаляем самые старые
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет кэш на диск (если что-то изменилось)
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+
+        save_json_atomic(self.path, data, lock=self._save_lock, label="кэш ответов")
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class Session:
+    """
+    Состояние диалога одного пользователя
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.history: List[Dict[str, Any]] = []
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        # Сообщения одного пользователя обрабатываем по очереди
+        self.lock = asyncio.Lock()
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def reset(self) -> None:
+        self.history.clear()
+
+
+class SessionManager:
+    """
+    Хранит изолированные сессии по ключу (user/chat id).
+    Вытеснение: по TTL неактивности и LRU при превышении max_sessions.
+    Сессии с занятым lock (идет ход) не вытесняются: иначе результат хода
+    записался бы в историю уже удаленной сессии, а следующее сообщение
+    получило бы новую сессию со своим lock и пошло параллельно.
+    """
+
+    def __init__(self, max_sessions: int = 500, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[Hashable, Session]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, key: Hashable) -> Session:
+        """
+        Возвращает сессию пользователя, создавая новую при необходимости
+        """
+        self.evict_expired()
+
+        session = self._sessions.get(key)
+        if session is None:
+            session = Session(key)
+            self._sessions[key] = session
+            self._evict_overflow()
+        else:
+            self._sessions.move_to_end(key)
+
+        session.touch()
+        return session
+
+    def _evict_overflow(self) -> None:
+        """
+        LRU: удаляет самые старые свободные сессии сверх max_sessions.
+        Если заняты все, лимит временно превышается
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for key, session in list(self._sessions.items()):
+            if excess <= 0:
+                break
+            if session.lock.locked():
+                continue
+            del self._sessions[key]
+            excess -= 1
+            self.evicted += 1
+
+    def peek(self, key: Hashable) -> Optional[Session]:
+        """
+        Возвращает сессию без обновления LRU порядка
+        """
+        return self._sessions.get(key)
+
+    def reset(self, key: Hashable) -> None:
+        """
+        Сбрасывает историю одной сессии
+        """
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            session.reset()
+
+    def evict_expired(self) -> int:
+        """
+        Удаляет сессии, неактивные дольше ttl_seconds
+        """
+        if not self.ttl_seconds:
+            return 0
+
+        deadline = time.monotonic() - self.ttl_seconds
+        removed = 0
+        # OrderedDict упорядочен по последнему обращению - старые в начале
+        for key, session in list(self._sessions.items()):
+            if session.last_active >= deadline:
+                break
+            if session.lock.locked():
+                continue
+            del self._sessions[key]
+            removed += 1
+
+        self.evicted += removed
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._sessions)
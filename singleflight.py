@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных вызовов (для потоков):
+    пока вызов с ключом выполняется, остальные ждут его результат.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._flights[key] = future
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """
+    То же для корутин: одна задача на ключ, все ожидающие получают ее результат.
+    Отмена одного ожидающего не отменяет общую задачу.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda _, key=key: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
@@ -1,8 +1,19 @@
 import os
+import asyncio
 import logging
+import time
+from typing import Optional
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.request import BaseRequest
 from linkedin_agent import LinkedInAgent
+from metrics import metrics, start_http_server
+from publish_queue import PublishWorker
+from response_cache import ResponseCache, response_key
+from session_manager import SessionManager
+from singleflight import AsyncSingleFlight
+from telegram_streaming import StreamingReply, split_message
+from trend_prefetcher import TrendPrefetcher
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,6 +27,40 @@ ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 LINKEDIN_ACCESS_TOKEN = os.getenv("LINKEDIN_ACCESS_TOKEN", "mock_token_test_mode")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ALLOWED_USERS = os.getenv("ALLOWED_USERS", "").split(",")
+# Кому доступна /stats (через запятую, пусто - никому)
+ADMIN_USERS = [user for user in os.getenv("ADMIN_USERS", "").split(",") if user]
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "500"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "12000"))
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+DATA_DIR = os.getenv("DATA_DIR", "data")
+FEED_CACHE_TTL_SECONDS = int(os.getenv("FEED_CACHE_TTL_SECONDS", "600"))
+# Фоновое обновление трендов: интервалы по источникам и допустимый возраст снимка (сек)
+TREND_PREFETCH_ENABLED = os.getenv("TREND_PREFETCH_ENABLED", "1") == "1"
+TREND_PREFETCH_INTERVALS = {
+    "rss": int(os.getenv("PREFETCH_RSS_INTERVAL", "900")),
+    "reddit": int(os.getenv("PREFETCH_REDDIT_INTERVAL", "600")),
+    "hn": int(os.getenv("PREFETCH_HN_INTERVAL", "300")),
+}
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "1800"))
+# Стриминг ответа правками сообщения: не чаще раза в STREAM_EDIT_INTERVAL секунд
+STREAMING_ENABLED = os.getenv("STREAMING_ENABLED", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+# Кэш ответов /trends и /create по содержимому снимка трендов (TTL в секундах)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+RESPONSE_CACHE_PERSIST = os.getenv("RESPONSE_CACHE_PERSIST", "1") == "1"
+# Метрики Prometheus на локальном порту (0 - не поднимать сервер)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Сколько апдейтов обрабатывать параллельно: без этого PTB ждет каждый апдейт
+# и долгий /create одного пользователя держит всех остальных (1 - строго по очереди)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+# Очередь публикаций: параллельность, пауза между публикациями (сек), попытки и базовая задержка повтора
+PUBLISH_CONCURRENCY = int(os.getenv("PUBLISH_CONCURRENCY", "1"))
+PUBLISH_MIN_INTERVAL_SECONDS = float(os.getenv("PUBLISH_MIN_INTERVAL_SECONDS", "60"))
+PUBLISH_MAX_ATTEMPTS = int(os.getenv("PUBLISH_MAX_ATTEMPTS", "5"))
+PUBLISH_RETRY_BASE_SECONDS = float(os.getenv("PUBLISH_RETRY_BASE_SECONDS", "30"))
 
 # Проверяем тестовый режим
 IS_TEST_MODE = LINKEDIN_ACCESS_TOKEN in ["mock_token_test_mode", "test_mode", "mock"]
@@ -30,9 +75,185 @@ agent = LinkedInAgent(
     ANTHROPIC_API_KEY,
     LINKEDIN_ACCESS_TOKEN,
     industry="product management",
-    target_audience="Product Managers, Directors of Product, Product Leads"
+    target_audience="Product Managers, Directors of Product, Product Leads",
+    history_token_budget=HISTORY_TOKEN_BUDGET,
+    feed_cache_path=os.path.join(CACHE_DIR, "feed_cache.json"),
+    feed_cache_ttl=FEED_CACHE_TTL_SECONDS,
+    trend_store_path=os.path.join(DATA_DIR, "trends.sqlite3"),
+    publish_queue_path=os.path.join(DATA_DIR, "publish_queue.sqlite3"),
+    # Пул инструментов под параллельность апдейтов (минимум как у обычного executor)
+    tool_workers=max(CONCURRENT_UPDATES, 32)
 )
 
+agent.snapshot_max_age = SNAPSHOT_MAX_AGE_SECONDS
+prefetcher = TrendPrefetcher(agent, intervals=TREND_PREFETCH_INTERVALS)
+publish_worker = PublishWorker(
+    agent.publish_queue,
+    agent.publish_post,
+    concurrency=PUBLISH_CONCURRENCY,
+    min_interval=PUBLISH_MIN_INTERVAL_SECONDS,
+    max_attempts=PUBLISH_MAX_ATTEMPTS,
+    base_delay=PUBLISH_RETRY_BASE_SECONDS
+)
+
+# Агент общий (клиенты, инструменты), а история диалога - своя у каждого пользователя
+sessions = SessionManager(max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS)
+
+
+# Одинаковые канонические команды (/trends, /create) в один момент считаются один раз:
+# ключ - команда + содержимое снимка трендов, прогресс транслируется всем ожидающим
+canned_flights = AsyncSingleFlight()
+canned_listeners = {}
+response_cache = ResponseCache(
+    os.path.join(CACHE_DIR, "response_cache.json") if RESPONSE_CACHE_PERSIST else None,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+)
+metrics_server = None
+
+
+def bot_metrics_samples():
+    """Коллектор метрик бота: кэш ответов, сессии, возраст снимка трендов"""
+    yield "cache_hits_total", "counter", {"cache": "response"}, response_cache.stats["hits"]
+    yield "cache_misses_total", "counter", {"cache": "response"}, response_cache.stats["misses"]
+    yield "bot_sessions", "gauge", {}, len(sessions)
+    yield "bot_canned_coalesced_total", "counter", {}, canned_flights.shared
+    for source, age in agent.trend_snapshot.ages().items():
+        yield "trend_snapshot_age_seconds", "gauge", {"source": source}, age
+    for status, total in agent.publish_queue.counts().items():
+        yield "publish_queue_posts", "gauge", {"status": status}, total
+
+
+metrics.describe("bot_handler_seconds", "Длительность обработки команды/сообщения")
+metrics.describe("bot_handler_errors_total", "Необработанные исключения в хендлерах")
+metrics.add_collector(agent.metrics_samples)
+metrics.add_collector(bot_metrics_samples)
+
+
+def session_key(update: Update) -> str:
+    """Ключ сессии: чат + пользователь (в группах у каждого своя история)"""
+    return f"{update.effective_chat.id}:{update.effective_user.id}"
+
+
+async def ask_agent(update: Update, message: str, on_text=None) -> str:
+    """Отправляет сообщение агенту в контексте сессии пользователя"""
+    session = sessions.get(session_key(update))
+    async with session.lock:
+        return await agent.achat(message, history=session.history, on_text=on_text)
+
+
+async def send_long_message(update: Update, text: str) -> None:
+    """Отправляет текст, разбивая по лимиту Telegram"""
+    for part in split_message(text):
+        await update.message.reply_text(part)
+
+
+async def agent_reply(update: Update, message: str, status) -> str:
+    """
+    Отвечает агентом: текст появляется в статусном сообщении по мере генерации,
+    длинный ответ продолжается в следующих сообщениях
+    """
+    if not STREAMING_ENABLED:
+        response = await ask_agent(update, message)
+        await send_long_message(update, response)
+        return response
+    
+    stream = StreamingReply(status, min_interval=STREAM_EDIT_INTERVAL)
+    response = await ask_agent(update, message, on_text=stream.update)
+    await stream.finish(response)
+    return response
+
+
+async def canned_reply(update: Update, command: str, prompt: str, status) -> str:
+    """
+    Ответ на фиксированный промпт команды. Считается вне истории пользователя:
+    - готовый ответ для тех же данных трендов берется из кэша без вызова модели
+    - одновременные одинаковые запросы объединяются в один
+    Затем пара запрос/ответ добавляется в историю сессии.
+    """
+    key = canned_key(command, prompt)
+    cached = response_cache.get(key) if RESPONSE_CACHE_ENABLED else None
+    
+    if cached is not None:
+        logger.info(f"/{command}: ответ из кэша ({round(time.time() - cached['created_at'])}с)")
+        response = cached["text"]
+        if STREAMING_ENABLED:
+            await StreamingReply(status, min_interval=STREAM_EDIT_INTERVAL).finish(response)
+        else:
+            await send_long_message(update, response)
+    else:
+        response = await coalesced_reply(update, command, prompt, key, status)
+    
+    session = sessions.get(session_key(update))
+    async with session.lock:
+        session.history.extend([
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": [{"type": "text", "text": response}]}
+        ])
+    return response
+
+
+def canned_key(command: str, prompt: str) -> str:
+    """Ключ ответа: команда + содержимое снимка трендов + конфигурация агента"""
+    config = {"industry": agent.industry, "target_audience": agent.target_audience, "model": agent.model}
+    return response_key(command, prompt, agent.trend_snapshot.content_hash(), config)
+
+
+async def coalesced_reply(update: Update, command: str, prompt: str, key: str, status) -> str:
+    """
+    Один запуск агента на ключ: прогресс транслируется всем ожидающим,
+    результат сохраняется в кэш ответов
+    """
+    stream = StreamingReply(status, min_interval=STREAM_EDIT_INTERVAL) if STREAMING_ENABLED else None
+    listeners = canned_listeners.setdefault(key, [])
+    if stream:
+        listeners.append(stream.update)
+    
+    async def broadcast(text: str) -> None:
+        await asyncio.gather(
+            *(listener(text) for listener in list(canned_listeners.get(key, []))),
+            return_exceptions=True
+        )
+    
+    async def run() -> str:
+        try:
+            response = await agent.achat(prompt, history=[], on_text=broadcast)
+        finally:
+            canned_listeners.pop(key, None)
+        if RESPONSE_CACHE_ENABLED and response:
+            response_cache.set(key, response)
+            # Если по ходу ответа снимок обновился, ответ соответствует уже новым данным
+            fresh_key = canned_key(command, prompt)
+            if fresh_key != key:
+                response_cache.set(fresh_key, response)
+            await asyncio.to_thread(response_cache.save)
+        return response
+    
+    if canned_flights.in_flight(key):
+        logger.info(f"/{command}: присоединяемся к уже выполняющемуся запросу")
+    try:
+        response = await canned_flights.do(key, run)
+    finally:
+        if stream and stream.update in canned_listeners.get(key, []):
+            canned_listeners[key].remove(stream.update)
+    
+    if stream:
+        await stream.finish(response)
+    else:
+        await send_long_message(update, response)
+    return response
+
+
+def instrumented(name: str, handler):
+    """Оборачивает хендлер замером длительности и счетчиком ошибок"""
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        with metrics.timer("bot_handler_seconds", handler=name):
+            try:
+                await handler(update, context)
+            except Exception:
+                metrics.inc("bot_handler_errors_total", handler=name)
+                raise
+    return wrapper
+
 
 def check_access(user_id: int) -> bool:
     """Проверяет, есть ли у пользователя доступ"""
@@ -116,14 +337,16 @@ async def trends_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text("❌ Нет доступа")
         return
     
-    await update.message.reply_text("🔍 Ищу актуальные тренды для PM... Это может занять минуту.")
+    status = await update.message.reply_text("🔍 Ищу актуальные тренды для PM... Это может занять минуту.")
     
     try:
-        response = agent.chat(
+        await canned_reply(
+            update,
+            "trends",
             "Покажи топ-5 самых актуальных трендов для продакт менеджеров "
-            "прямо сейчас. Используй get_product_trends и кратко опиши каждый тренд."
+            "прямо сейчас. Используй get_product_trends и кратко опиши каждый тренд.",
+            status
         )
-        await update.message.reply_text(response)
     except Exception as e:
         logger.error(f"Error in trends command: {e}")
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
@@ -138,40 +361,38 @@ async def create_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     
     if IS_TEST_MODE:
-        await update.message.reply_text(
+        status = await update.message.reply_text(
             "✍️ Создаю пост на актуальную тему...\n"
             "🧪 Тестовый режим: покажу пост для ручного копирования\n"
             "⏱️ Займёт 1-2 минуты."
         )
     else:
-        await update.message.reply_text(
+        status = await update.message.reply_text(
             "✍️ Создаю пост на актуальную тему...\n"
             "⏱️ Займёт 1-2 минуты."
         )
     
     try:
         if IS_TEST_MODE:
-            response = agent.chat(
+            await canned_reply(
+                update,
+                "create",
                 "Найди самую актуальную и обсуждаемую тему для продакт менеджеров. "
                 "Создай вовлекающий пост в стиле для PM аудитории с практическими советами. "
                 "Покажи готовый пост в формате для копирования в LinkedIn. "
-                "НЕ вызывай функцию create_linkedin_post - я в тестовом режиме."
+                "НЕ вызывай функцию create_linkedin_post - я в тестовом режиме.",
+                status
             )
         else:
-            response = agent.chat(
+            await canned_reply(
+                update,
+                "create",
                 "Найди самую актуальную и обсуждаемую тему для продакт менеджеров. "
                 "Создай вовлекающий пост в стиле для PM аудитории с практическими советами. "
-                "Покажи мне пост для подтверждения перед публикацией."
+                "Покажи мне пост для подтверждения перед публикацией.",
+                status
             )
         
-        # Разбиваем длинные сообщения
-        if len(response) > 4000:
-            parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-            for part in parts:
-                await update.message.reply_text(part)
-        else:
-            await update.message.reply_text(response)
-        
         if IS_TEST_MODE:
             await update.message.reply_text(
                 "\n📋 ГОТОВО!\n"
@@ -203,14 +424,15 @@ async def analyze_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
     
-    await update.message.reply_text(f"🔍 Анализирую актуальность темы: '{topic}'...")
+    status = await update.message.reply_text(f"🔍 Анализирую актуальность темы: '{topic}'...")
     
     try:
-        response = agent.chat(
+        await agent_reply(
+            update,
             f"Проверь насколько актуальна тема '{topic}' для продакт менеджеров прямо сейчас. "
-            f"Используй веб-поиск и product источники. Дай оценку и рекомендацию."
+            f"Используй веб-поиск и product источники. Дай оценку и рекомендацию.",
+            status
         )
-        await update.message.reply_text(response)
     except Exception as e:
         logger.error(f"Error in analyze command: {e}")
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
@@ -248,9 +470,73 @@ async def sources_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text(sources_text)
 
 
+def format_stats() -> str:
+    """Сводка метрик для /stats"""
+    def label(key, name):
+        return dict(key).get(name, "")
+
+    def latency_lines(metric, label_name, limit=8):
+        summary = metrics.histogram_summary(metric)
+        rows = sorted(summary.items(), key=lambda item: item[1]["count"] * item[1]["avg"], reverse=True)
+        return [
+            f"• {label(key, label_name)}: {row['count']}× p50 {row['p50']:.2f}с / p95 {row['p95']:.2f}с"
+            for key, row in rows[:limit]
+        ] or ["• нет данных"]
+
+    samples = metrics.collect()
+    tokens = {labels["type"]: value for name, _, labels, value in samples if name == "llm_tokens_total"}
+    caches = {}
+    for name, _, labels, value in samples:
+        if name in ("cache_hits_total", "cache_misses_total"):
+            caches.setdefault(labels["cache"], [0, 0])[name == "cache_misses_total"] += value
+
+    cache_lines = []
+    for cache, (hits, misses) in sorted(caches.items()):
+        total = hits + misses
+        rate = f"{hits / total:.0%}" if total else "—"
+        cache_lines.append(f"• {cache}: {rate} ({int(hits)}/{int(total)})")
+
+    iterations = metrics.histogram_summary("agent_turn_iterations")
+    turns = sum(row["count"] for row in iterations.values())
+    avg_iterations = sum(row["avg"] * row["count"] for row in iterations.values()) / turns if turns else 0
+    tool_errors = sum(metrics.counter_values("agent_tool_errors_total").values())
+    queue = agent.publish_queue.counts()
+
+    return "\n".join([
+        "📊 СТАТИСТИКА",
+        "",
+        "⏱️ Хендлеры:", *latency_lines("bot_handler_seconds", "handler"),
+        "",
+        "🤖 Запросы к модели:", *latency_lines("llm_request_seconds", "mode"),
+        "",
+        "🔧 Инструменты:", *latency_lines("agent_tool_seconds", "tool"),
+        f"• ошибок: {int(tool_errors)}",
+        "",
+        "🌐 HTTP хосты:", *latency_lines("http_request_seconds", "host"),
+        "",
+        f"🔁 Ходов: {turns}, запросов к модели на ход: {avg_iterations:.1f}",
+        "",
+        "📤 Очередь публикаций: " + ", ".join(f"{status} {total}" for status, total in queue.items()),
+        "",
+        "🪙 Токены: " + ", ".join(f"{kind} {int(value)}" for kind, value in sorted(tokens.items())),
+        "",
+        "💾 Кэши (hit rate):", *(cache_lines or ["• нет данных"]),
+        "",
+        f"👥 Сессий: {len(sessions)}",
+    ])
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Метрики бота (только для администраторов)"""
+    if str(update.effective_user.id) not in ADMIN_USERS:
+        await update.message.reply_text("❌ Нет доступа")
+        return
+    await send_long_message(update, format_stats())
+
+
 async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Сброс истории диалога"""
-    agent.conversation_history = []
+    sessions.reset(session_key(update))
     await update.message.reply_text(
         "🔄 История диалога сброшена!\n"
         "Начинаем с чистого листа."
@@ -270,6 +556,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_message = update.message.text
     
     await update.message.chat.send_action(action="typing")
+    status = await update.message.reply_text("💭 Думаю...")
     
     try:
         logger.info(f"User {user_id}: {user_message}")
@@ -280,18 +567,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         else:
             context_message = user_message
         
-        response = agent.chat(context_message)
+        response = await agent_reply(update, context_message, status)
         
         logger.info(f"Agent response length: {len(response)}")
         
-        # Разбиваем длинные сообщения
-        if len(response) > 4000:
-            parts = [response[i:i+4000] for i in range(0, len(response), 4000)]
-            for part in parts:
-                await update.message.reply_text(part)
-        else:
-            await update.message.reply_text(response)
-        
         # Напоминание о тестовом режиме при упоминании публикации
         if IS_TEST_MODE and any(word in user_message.lower() for word in ['опубликуй', 'publish']):
             await update.message.reply_text(
@@ -310,6 +589,30 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
 
 
+async def on_startup(application: Application) -> None:
+    """Запускает фоновое обновление трендов и очередь публикаций вместе с ботом"""
+    global metrics_server
+    if TREND_PREFETCH_ENABLED:
+        await prefetcher.start()
+    await publish_worker.start()
+    if METRICS_PORT and metrics_server is None:
+        try:
+            metrics_server = start_http_server(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            logger.error(f"Не удалось поднять сервер метрик на порту {METRICS_PORT}: {e}")
+
+
+async def on_shutdown(application: Application) -> None:
+    """Останавливает фоновые задачи"""
+    global metrics_server
+    await prefetcher.stop()
+    await publish_worker.stop()
+    response_cache.save()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server = None
+
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обработчик ошибок"""
     logger.error(f"Update {update} caused error {context.error}", exc_info=context.error)
@@ -331,18 +634,7 @@ def main() -> None:
     logger.info(f"{'🧪 Режим: ТЕСТОВЫЙ (mock token)' if IS_TEST_MODE else '✅ Режим: PRODUCTION'}")
     logger.info("=" * 60)
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-    
-    # Регистрируем обработчики
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("trends", trends_command))
-    application.add_handler(CommandHandler("create", create_command))
-    application.add_handler(CommandHandler("analyze", analyze_command))
-    application.add_handler(CommandHandler("sources", sources_command))
-    application.add_handler(CommandHandler("reset", reset_command))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_error_handler(error_handler)
+    application = build_application(TELEGRAM_BOT_TOKEN)
     
     logger.info("✅ Бот запущен и готов к работе!")
     if IS_TEST_MODE:
@@ -351,5 +643,40 @@ def main() -> None:
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
+def build_application(token: str, request: Optional[BaseRequest] = None,
+                      concurrent_updates: Optional[int] = None) -> Application:
+    """
+    Собирает Application со всеми обработчиками.
+    request - свой транспорт Bot API (нагрузочные тесты подставляют мок)
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    concurrent_updates = CONCURRENT_UPDATES if concurrent_updates is None else concurrent_updates
+    if concurrent_updates > 1:
+        # Апдейты разных пользователей обрабатываются параллельно,
+        # порядок в рамках сессии держит session.lock
+        builder = builder.concurrent_updates(concurrent_updates)
+    application = builder.build()
+    
+    # Регистрируем обработчики
+    application.add_handler(CommandHandler("start", instrumented("start", start)))
+    application.add_handler(CommandHandler("help", instrumented("help", help_command)))
+    application.add_handler(CommandHandler("trends", instrumented("trends", trends_command)))
+    application.add_handler(CommandHandler("create", instrumented("create", create_command)))
+    application.add_handler(CommandHandler("analyze", instrumented("analyze", analyze_command)))
+    application.add_handler(CommandHandler("sources", instrumented("sources", sources_command)))
+    application.add_handler(CommandHandler("reset", instrumented("reset", reset_command)))
+    application.add_handler(CommandHandler("stats", instrumented("stats", stats_command)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented("message", handle_message)))
+    application.add_error_handler(error_handler)
+    return application
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from typing import List
+
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram 4096 символов, оставляем запас как и в остальном боте
+MESSAGE_LIMIT = 4000
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """Режет длинный текст на части по лимиту Telegram"""
+    return [text[i:i + limit] for i in range(0, len(text), limit)] or [""]
+
+
+class StreamingReply:
+    """
+    Прогрессивный вывод ответа: редактирует статусное сообщение по мере генерации.
+    - правки не чаще min_interval секунд (лимиты Telegram на editMessageText)
+    - при превышении лимита длины продолжает в новом сообщении
+    - пустой текст (ход ушел в инструменты) возвращает статус
+    """
+
+    def __init__(self, status: Message, min_interval: float = 1.5,
+                 working_text: str = "🔧 Собираю данные..."):
+        self.status_text = status.text or ""
+        self.working_text = working_text
+        self.min_interval = min_interval
+        self.messages: List[Message] = [status]
+        self._shown: List[str] = [self.status_text]
+        self._text = ""
+        self._next_edit = 0.0
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str) -> None:
+        """Колбэк для LinkedInAgent.achat(on_text=...)"""
+        self._text = text
+        if time.monotonic() >= self._next_edit and not self._lock.locked():
+            await self._flush()
+
+    async def finish(self, text: str) -> None:
+        """Показывает финальный текст полностью, независимо от троттлинга"""
+        self._text = text or "⚠️ Пустой ответ"
+        expected = split_message(self._text)
+        # Повторяем, если финальную правку отклонил RetryAfter
+        for _ in range(3):
+            wait = self._next_edit - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._flush(final=True)
+            if self._shown == expected:
+                break
+
+    async def _flush(self, final: bool = False) -> None:
+        async with self._lock:
+            if self._text:
+                chunks = split_message(self._text)
+                if not final:
+                    # Курсор показывает, что текст еще пишется
+                    chunks[-1] += " ▌"
+            else:
+                chunks = [self.working_text]
+
+            # Лишние сообщения (от промежуточного хода) убираем
+            while len(self.messages) > len(chunks):
+                extra = self.messages.pop()
+                self._shown.pop()
+                await self._call(extra.delete())
+
+            for index, chunk in enumerate(chunks):
+                if index < len(self.messages):
+                    if self._shown[index] != chunk:
+                        if await self._call(self.messages[index].edit_text(chunk)) is not None:
+                            self._shown[index] = chunk
+                else:
+                    message = await self._call(self.messages[0].chat.send_message(chunk))
+                    if message is None:
+                        break
+                    self.messages.append(message)
+                    self._shown.append(chunk)
+
+            self._next_edit = max(self._next_edit, time.monotonic() + self.min_interval)
+
+    async def _call(self, request):
+        try:
+            return await request
+        except RetryAfter as e:
+            # Telegram попросил подождать - откладываем следующую правку
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self._next_edit = time.monotonic() + float(retry_after)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"Не удалось обновить сообщение: {e}")
+        except TelegramError as e:
+            logger.warning(f"Ошибка Telegram при стриминге: {e}")
+        return None
@@ -0,0 +1,140 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from dedup import TRACKING_PARAMS, TRACKING_PREFIXES
+from history_compactor import CHARS_PER_TOKEN, estimate_tokens
+
+URL_KEYS = {"url", "link", "target_url"}
+# Служебные ключи верхнего уровня, которые повторяются в каждом ответе
+REDUNDANT_KEYS = {"summary", "message"}
+# Поля для хранилища и скорости трендов, модели они не нужны (дата есть в published/created)
+INTERNAL_KEYS = {"published_at"}
+# Никогда не сокращаются при превышении потолка
+PROTECTED_KEYS = {"trending_keywords", "top_keywords"}
+
+
+def encode_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def shorten_url(url: str) -> str:
+    """
+    https://www.example.com/a/?utm_source=x -> example.com/a
+    """
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = "&".join(
+        pair for pair in parts.query.split("&")
+        if pair and pair.split("=", 1)[0].lower() not in TRACKING_PARAMS
+        and not pair.lower().startswith(TRACKING_PREFIXES)
+    )
+    short = host + parts.path.rstrip("/")
+    return f"{short}?{query}" if query else short
+
+
+def _prune(value: Any) -> Any:
+    """
+    Убирает пустые значения и сокращает ссылки на любом уровне вложенности
+    """
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            if key in INTERNAL_KEYS:
+                continue
+            if key in URL_KEYS and isinstance(item, str):
+                item = shorten_url(item)
+            else:
+                item = _prune(item)
+            if item in ("", None, [], {}):
+                continue
+            pruned[key] = item
+        return pruned
+    if isinstance(value, list):
+        return [_prune(item) for item in value]
+    return value
+
+
+def _item_groups(value: Any) -> Iterable[List]:
+    """
+    Списки объектов (группы источников), которые можно сокращать.
+    Сводки ключевых слов не трогаем: это выжимка по всем источникам
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in PROTECTED_KEYS:
+                continue
+            if isinstance(item, list) and any(isinstance(element, dict) for element in item):
+                yield item
+            else:
+                yield from _item_groups(item)
+
+
+def _drop_order(group: List) -> List[int]:
+    """
+    Индексы группы от худшего к лучшему: по вовлеченности (score + comments),
+    где ее нет (RSS) - по исходному порядку
+    """
+    def rank(index: int) -> Tuple[float, int]:
+        item = group[index]
+        if not isinstance(item, dict):
+            return 0, -index
+        return (item.get("score") or 0) + (item.get("comments") or 0), -index
+    return sorted(range(len(group)), key=rank)
+
+
+def compact_tool_result(result: Dict[str, Any], token_ceiling: Optional[int] = None,
+                        keep_keys: Iterable[str] = ()) -> Tuple[str, Dict[str, int]]:
+    """
+    Кодирует результат инструмента для модели:
+    - компактные разделители JSON, без пустых полей
+    - без success=true и повторяющихся служебных ключей верхнего уровня
+    - короткие ссылки без схемы, www и трекинга
+    - при превышении token_ceiling группы источников сокращаются пропорционально,
+      в каждой удаляются элементы с наименьшим рангом; сводка ключевых слов сохраняется
+    Возвращает (строка, статистика размеров до/после).
+    """
+    original = json.dumps(result, ensure_ascii=False)
+    compact = _prune(result)
+
+    if compact.get("success") is True:
+        del compact["success"]
+        for key in REDUNDANT_KEYS - set(keep_keys):
+            compact.pop(key, None)
+
+    encoded = encode_json(compact)
+    truncated = 0
+    if token_ceiling and estimate_tokens(encoded) > token_ceiling:
+        # Сокращаем группы пропорционально: каждый раз из той, где сохранилась
+        # наибольшая доля, удаляется ее худший элемент (последний элемент группы
+        # уходит, только когда во всех остальных тоже остался один)
+        excess = len(encoded) - token_ceiling * CHARS_PER_TOKEN
+        groups = [(group, _drop_order(group), set()) for group in _item_groups(compact) if group]
+        while excess > 0:
+            candidates = [entry for entry in groups if len(entry[2]) < len(entry[0])]
+            if not candidates:
+                break
+            group, order, doomed = max(
+                candidates, key=lambda entry: ((len(entry[0]) - len(entry[2]) - 1) / len(entry[0]), len(entry[0]))
+            )
+            index = order[len(doomed)]
+            excess -= len(encode_json(group[index])) + 1
+            doomed.add(index)
+            truncated += 1
+        for group, _, doomed in groups:
+            group[:] = [item for i, item in enumerate(group) if i not in doomed]
+        compact["truncated"] = truncated
+        encoded = encode_json(compact)
+
+    stats = {
+        "bytes_before": len(original.encode("utf-8")),
+        "bytes_after": len(encoded.encode("utf-8")),
+        "tokens_before": estimate_tokens(original),
+        "tokens_after": estimate_tokens(encoded),
+        "truncated": truncated
+    }
+    return encoded, stats
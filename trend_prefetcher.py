@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TrendSnapshot:
+    """
+    Версионированный снимок последних результатов по каждому источнику трендов
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._sources: Dict[str, Dict[str, Any]] = {}
+        self._hash = ""
+        self._hash_version = -1
+        self._lock = threading.Lock()
+
+    def update(self, name: str, result: Dict[str, Any], seconds: float = 0.0) -> int:
+        """
+        Сохраняет свежий результат источника и возвращает новую версию снимка
+        """
+        with self._lock:
+            self.version += 1
+            self._sources[name] = {
+                "result": result,
+                "seconds": seconds,
+                "updated_at": time.time(),
+                "version": self.version
+            }
+            return self.version
+
+    def get(self, name: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Запись источника, если она есть и не старше max_age секунд
+        """
+        with self._lock:
+            entry = self._sources.get(name)
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry["updated_at"] > max_age:
+            return None
+        return entry
+
+    @staticmethod
+    def _identity(result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Устойчивая часть результата источника: какие материалы в нем есть (ссылка + заголовок).
+        score/comments меняются при каждом обновлении HN/Reddit и в хэш не входят
+        """
+        identity = {"success": result.get("success")}
+        for key, value in result.items():
+            if isinstance(value, list):
+                identity[key] = [
+                    [item.get("url") or item.get("link"), item.get("title")]
+                    for item in value if isinstance(item, dict)
+                ]
+        return identity
+
+    def content_hash(self) -> str:
+        """
+        Хэш состава снимка (без времени обновления и счетчиков): те же материалы -
+        тот же хэш, даже если источник перезагружался и у историй вырос score
+        """
+        with self._lock:
+            if self._hash_version != self.version:
+                payload = json.dumps(
+                    {name: self._identity(entry["result"]) for name, entry in self._sources.items()},
+                    sort_keys=True, ensure_ascii=False, default=str
+                )
+                self._hash = hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+                self._hash_version = self.version
+            return self._hash
+
+    def ages(self) -> Dict[str, float]:
+        now = time.time()
+        with self._lock:
+            return {name: round(now - entry["updated_at"], 1) for name, entry in self._sources.items()}
+
+
+class TrendPrefetcher:
+    """
+    Фоновое обновление источников трендов внутри event loop бота.
+    Каждый источник обновляется по своему интервалу и пишет в agent.trend_snapshot,
+    поэтому инструменты отвечают из теплого снимка без ожидания сети.
+    """
+
+    def __init__(self, agent, intervals: Optional[Dict[str, float]] = None,
+                 default_interval: float = 600):
+        self.agent = agent
+        self.intervals = intervals or {}
+        self.default_interval = default_interval
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def interval_for(self, name: str) -> float:
+        # "reddit:SaaS" наследует интервал "reddit", если свой не задан
+        return self.intervals.get(name, self.intervals.get(name.split(":", 1)[0], self.default_interval))
+
+    async def start(self) -> None:
+        for name, fetch in self.agent._product_trend_sources().items():
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._refresh_loop(name, fetch))
+        logger.info(f"Фоновое обновление трендов запущено: {', '.join(self._tasks)}")
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    async def refresh(self, name: str, fetch) -> bool:
+        """
+        Однократно обновляет источник, True при успехе
+        """
+        run = await asyncio.to_thread(self.agent._fetch_source, name, fetch)
+        if not run["result"].get("success"):
+            logger.warning(f"Источник {name} не обновлен: {run['result'].get('error')}")
+            return False
+        version = self.agent.trend_snapshot.update(name, run["result"], run["seconds"])
+        logger.info(f"Источник {name} обновлен за {run['seconds']}с (снимок v{version})")
+        return True
+
+    async def _refresh_loop(self, name: str, fetch) -> None:
+        interval = self.interval_for(name)
+        while True:
+            try:
+                await self.refresh(name, fetch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления {name}: {e}")
+            await asyncio.sleep(interval)
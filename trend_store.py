@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Окна, доступные инструментам: имя -> часы
+WINDOWS = {"24h": 24, "7d": 24 * 7}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    score INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    published_at REAL NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_source ON items (source);
+CREATE INDEX IF NOT EXISTS idx_items_published ON items (published_at);
+CREATE INDEX IF NOT EXISTS idx_items_kind_published ON items (kind, published_at);
+"""
+
+UPSERT = """
+INSERT INTO items (kind, source, url, title, summary, score, comments,
+                   published_at, first_seen, last_seen, content_hash)
+VALUES (:kind, :source, :url, :title, :summary, :score, :comments,
+        :published_at, :now, :now, :content_hash)
+ON CONFLICT(url) DO UPDATE SET
+    title = excluded.title,
+    summary = excluded.summary,
+    score = excluded.score,
+    comments = excluded.comments,
+    last_seen = excluded.last_seen,
+    content_hash = excluded.content_hash
+WHERE items.content_hash != excluded.content_hash
+"""
+
+
+def _parse_date(value: Any, default: float) -> float:
+    """
+    "%Y-%m-%d" из инструментов -> unix timestamp (только для элементов без published_at:
+    дата без времени датирует элемент полуночью)
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value[:10], "%Y-%m-%d").timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+def _published_at(item: Dict[str, Any], now: float) -> float:
+    """
+    Точное время публикации элемента: published_at (RSS published_parsed,
+    Reddit created_utc, HN time), иначе дата из отображаемой строки
+    """
+    if isinstance(item.get("published_at"), (int, float)):
+        return float(item["published_at"])
+    return _parse_date(item.get("published") or item.get("created"), now)
+
+
+class TrendStore:
+    """
+    Локальное SQLite хранилище статей, постов и историй.
+    Повторная загрузка того же элемента пишет в базу только если он изменился.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _row(kind: str, source: str, item: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+        url = item.get("link") or item.get("url")
+        if not url:
+            return None
+        row = {
+            "kind": kind,
+            "source": item.get("source") or source,
+            "url": url,
+            "title": item.get("title", ""),
+            "summary": item.get("summary", ""),
+            "score": int(item.get("score") or 0),
+            "comments": int(item.get("comments") or 0),
+            "published_at": _published_at(item, now),
+            "now": now,
+        }
+        fingerprint = json.dumps(
+            [row["title"], row["summary"], row["score"], row["comments"]], ensure_ascii=False
+        )
+        row["content_hash"] = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+        return row
+
+    def ingest(self, kind: str, source: str, items: Iterable[Dict[str, Any]]) -> int:
+        """
+        Upsert элементов одного источника, возвращает число новых/измененных строк
+        """
+        now = time.time()
+        rows = [row for row in (self._row(kind, source, item, now) for item in items) if row]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            with self._conn:
+                self._conn.executemany(UPSERT, rows)
+            return self._conn.total_changes - before
+
+    def query(self, window: str = "24h", kind: Optional[str] = None,
+              source: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Элементы, опубликованные за окно, по убыванию score.
+        Элементы без даты публикации датируются моментом первой загрузки
+        """
+        since = time.time() - WINDOWS.get(window, 24) * 3600
+        sql = ["SELECT kind, source, url, title, summary, score, comments, published_at",
+               "FROM items WHERE published_at >= ?"]
+        params: List[Any] = [since]
+        if kind:
+            sql.append("AND kind = ?")
+            params.append(kind)
+        if source:
+            sql.append("AND source = ?")
+            params.append(source)
+        sql.append("ORDER BY score DESC, published_at DESC LIMIT ?")
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        items = []
+        for row in rows:
+            item = dict(row)
+            item["published"] = datetime.fromtimestamp(item.pop("published_at")).strftime("%Y-%m-%d")
+            items.append(item)
+        return items
+
+    def documents(self, window: str = "7d") -> List[tuple]:
+        """
+        (заголовок. описание, время публикации) за окно - для прогрева скорости трендов
+        """
+        since = time.time() - WINDOWS.get(window, 24) * 3600
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, summary, published_at FROM items WHERE published_at >= ? "
+                "ORDER BY published_at", (since,)
+            ).fetchall()
+        return [(f"{row['title']}. {row['summary']}", row["published_at"]) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,172 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class _TermSeries:
+    """
+    Счетчики одного термина по временным корзинам + бегущие суммы
+    """
+    __slots__ = ("buckets", "total", "total_sq")
+
+    def __init__(self):
+        self.buckets: deque = deque()  # [индекс корзины, счетчик]
+        self.total = 0
+        self.total_sq = 0
+
+    def increment(self, bucket: int) -> None:
+        if not self.buckets or self.buckets[-1][0] < bucket:
+            count = 0
+            self.buckets.append([bucket, 1])
+        elif self.buckets[-1][0] == bucket:
+            count = self.buckets[-1][1]
+            self.buckets[-1][1] = count + 1
+        else:
+            # Материал из прошлого (дата публикации раньше последней корзины)
+            position = len(self.buckets) - 1
+            while position >= 0 and self.buckets[position][0] > bucket:
+                position -= 1
+            if position >= 0 and self.buckets[position][0] == bucket:
+                count = self.buckets[position][1]
+                self.buckets[position][1] = count + 1
+            else:
+                count = 0
+                self.buckets.insert(position + 1, [bucket, 1])
+        self.total += 1
+        self.total_sq += 2 * count + 1
+
+    def expire(self, oldest_bucket: int) -> None:
+        while self.buckets and self.buckets[0][0] < oldest_bucket:
+            _, count = self.buckets.popleft()
+            self.total -= count
+            self.total_sq -= count * count
+
+    def current(self, bucket: int) -> int:
+        if self.buckets and self.buckets[-1][0] == bucket:
+            return self.buckets[-1][1]
+        return 0
+
+
+class TrendVelocity:
+    """
+    Скорость трендов: сколько материалов, опубликованных в текущей корзине
+    времени, упоминает термин по сравнению с его собственной базой за прошлые корзины.
+    Материал попадает в корзину по времени публикации, а не загрузки.
+    Ранжирование по z-score: (текущее - среднее) / стандартное отклонение.
+    Бегущие суммы обновляются при каждом добавлении, поэтому рейтинг
+    не пересчитывает историю.
+    """
+
+    def __init__(self, terms_of, bucket_seconds: int = 3600, window_buckets: int = 168,
+                 min_count: int = 2, max_seen_documents: int = 50000):
+        self.terms_of = terms_of
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.min_count = min_count
+        self.max_seen_documents = max_seen_documents
+        self._series: Dict[str, _TermSeries] = {}
+        self._seen: "OrderedDict[bytes, None]" = OrderedDict()
+        self._start_bucket: Optional[int] = None
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, timestamp: Optional[float] = None) -> int:
+        return int((timestamp if timestamp is not None else time.time()) // self.bucket_seconds)
+
+    def observe(self, documents: Iterable[str], timestamp: Optional[float] = None) -> int:
+        """
+        Учитывает новые документы с общим временем (уже виденные пропускаются)
+        """
+        return self.observe_timed((document, timestamp) for document in documents)
+
+    def observe_timed(self, documents: Iterable[Tuple[str, Optional[float]]]) -> int:
+        """
+        Учитывает пары (документ, время публикации), возвращает число новых.
+        Без времени - текущая корзина, старше окна - пропускаются
+        """
+        now_bucket = self._bucket()
+        oldest = now_bucket - self.window_buckets
+        added = 0
+        with self._lock:
+            for document, timestamp in documents:
+                if not document:
+                    continue
+                bucket = min(self._bucket(timestamp), now_bucket) if timestamp else now_bucket
+                if bucket <= oldest:
+                    continue
+                key = hashlib.blake2b(document.encode("utf-8"), digest_size=8).digest()
+                if key in self._seen:
+                    continue
+                self._seen[key] = None
+                if len(self._seen) > self.max_seen_documents:
+                    self._seen.popitem(last=False)
+
+                for term in set(self.terms_of(document)):
+                    series = self._series.get(term)
+                    if series is None:
+                        series = self._series[term] = _TermSeries()
+                    series.increment(bucket)
+                if self._start_bucket is None or bucket < self._start_bucket:
+                    self._start_bucket = bucket
+                added += 1
+            self._sweep(now_bucket)
+        return added
+
+    def _sweep(self, bucket: int) -> None:
+        """
+        Раз в корзину удаляет термины, выпавшие из окна целиком
+        """
+        if bucket == self._last_sweep:
+            return
+        self._last_sweep = bucket
+        oldest = bucket - self.window_buckets
+        for term in list(self._series):
+            series = self._series[term]
+            series.expire(oldest)
+            if not series.buckets:
+                del self._series[term]
+
+    def rising(self, limit: int = 10, timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Термины с наибольшим ускорением в текущей корзине
+        """
+        bucket = self._bucket(timestamp)
+        oldest = bucket - self.window_buckets
+        results = []
+        with self._lock:
+            if self._start_bucket is None:
+                return []
+            # Число завершенных корзин в базе (нулевые корзины учитываются через N)
+            baseline_buckets = max(min(bucket - self._start_bucket, self.window_buckets), 1)
+            for term, series in self._series.items():
+                current = series.current(bucket)
+                if current < self.min_count:
+                    continue
+                series.expire(oldest)
+                base_total = series.total - current
+                base_sq = series.total_sq - current * current
+                mean = base_total / baseline_buckets
+                std = math.sqrt(max(base_sq / baseline_buckets - mean * mean, 0.0))
+                # Нижняя граница std, чтобы редкие термины не получали бесконечный z
+                z_score = (current - mean) / max(std, 1.0)
+                results.append({
+                    "term": term,
+                    "current": current,
+                    "baseline_mean": round(mean, 2),
+                    "z_score": round(z_score, 2)
+                })
+
+        results.sort(key=lambda item: (item["z_score"], item["current"]), reverse=True)
+        return results[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "terms": len(self._series),
+                "documents_seen": len(self._seen),
+                "bucket_seconds": self.bucket_seconds,
+                "window_buckets": self.window_buckets
+            }